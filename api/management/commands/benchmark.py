@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from campaign.models import Campaign
+from campaign.tokens import DonationToken
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from users.models import User
+from users.serializers import UserClaimsTokenObtainPairSerializer
+from wallet.models import DonationHistory, TopUpHistory, WithdrawRequest
+
+PASSWORD = "benchmark1234"
+
+
+def bearer(user):
+    return str(UserClaimsTokenObtainPairSerializer.get_token(user).access_token)
+
+
+def auth(client, token):
+    # AsyncClient takes extra headers by their raw name, not as META keys.
+    if isinstance(client, AsyncClient):
+        return {"authorization": f"Bearer {token}"}
+    return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+
+class Fixture:
+    """
+    Users, campaigns and histories seeded for a benchmark run, plus
+    the access tokens the scenarios send.
+    """
+
+    def __init__(self, users, campaigns, histories):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            User(email=f"donor{i}@benchmark.test", first_name="Donor", last_name=str(i),
+                 password=password, role="DONATUR", wallet_amount=10 ** 9) for i in range(users))
+        User.objects.bulk_create(
+            User(email=f"fundraiser{i}@benchmark.test", first_name="Fundraiser", last_name=str(i),
+                 password=password, role="FUNDRAISER", verified=True) for i in range(max(users // 10, 1)))
+        self.admin = User.objects.create_superuser(
+            email="admin@benchmark.test", password=PASSWORD, first_name="Admin", last_name="Benchmark")
+
+        donors = list(User.objects.filter(role="DONATUR"))
+        fundraisers = list(User.objects.filter(role="FUNDRAISER"))
+        Campaign.objects.bulk_create(
+            Campaign(title=f"Campaign {i}", description="Benchmark campaign " * 20, target_amount=10 ** 8,
+                     status="VERIFIED", fundraiser=random.choice(fundraisers)) for i in range(campaigns))
+        self.campaign_ids = list(Campaign.objects.values_list("id", flat=True))
+
+        DonationHistory.objects.bulk_create(
+            DonationHistory(user=random.choice(donors), campaign_id=random.choice(self.campaign_ids),
+                            amount=random.randrange(5000, 100000)) for _ in range(histories))
+        TopUpHistory.objects.bulk_create(
+            TopUpHistory(user=random.choice(donors), amount=100000, bank_name="BCA",
+                         bank_account="Benchmark", bank_account_number="0123456789") for _ in range(histories))
+        seeded = list(Campaign.objects.only("id", "fundraiser_id"))
+        WithdrawRequest.objects.bulk_create(
+            WithdrawRequest(user_id=campaign.fundraiser_id, campaign=campaign, amount=5000)
+            for campaign in random.choices(seeded, k=histories))
+
+        self.donor_tokens = [bearer(donor) for donor in donors]
+        self.donation_tokens = {token: str(DonationToken.for_user(donor))
+                                for token, donor in zip(self.donor_tokens, donors)}
+        self.admin_token = bearer(self.admin)
+
+
+def donate(client, fixture, with_donation_token):
+    token = random.choice(fixture.donor_tokens)
+    if with_donation_token:
+        confirmation = {"donation_token": fixture.donation_tokens[token]}
+    else:
+        confirmation = {"password": PASSWORD}
+    return client.post(f"/api/donor/campaigns/{random.choice(fixture.campaign_ids)}/",
+                       json.dumps({"amount": 5000, **confirmation}), content_type="application/json",
+                       **auth(client, token))
+
+
+# Each scenario returns the response, or a coroutine of it for an AsyncClient.
+SCENARIOS = {
+    "campaigns": lambda client, fixture: client.get("/api/campaigns/"),
+    "campaign-donor-id": lambda client, fixture: client.get(
+        f"/api/donor/campaigns/{random.choice(fixture.campaign_ids)}/",
+        **auth(client, random.choice(fixture.donor_tokens))),
+    "donate": lambda client, fixture: donate(client, fixture, with_donation_token=False),
+    "donate-token": lambda client, fixture: donate(client, fixture, with_donation_token=True),
+    "donation": lambda client, fixture: client.get(
+        "/api/donate/", **auth(client, random.choice(fixture.donor_tokens))),
+    "topup-verify": lambda client, fixture: client.get(
+        "/api/topup/requests/", **auth(client, fixture.admin_token)),
+}
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway database and measure latency, queries per request and "
+            "throughput of the main API endpoints. Prints the report as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--campaigns", type=int, default=1000)
+        parser.add_argument("--histories", type=int, default=5000,
+                            help="Donation and top up history rows to seed.")
+        parser.add_argument("--requests", type=int, default=200,
+                            help="Requests sent to each scenario.")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                            help="Scenario to run, may be repeated. Defaults to all.")
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+        parser.add_argument("--current-db", action="store_true",
+                            help="Seed the configured database instead of creating a test database.")
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        old_name = None
+        if not options["current_db"]:
+            if connection.vendor == "sqlite":
+                # A file keeps SQLite's busy timeout working across threads,
+                # the shared in-memory test database fails fast on lock.
+                connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                    tempfile.gettempdir(), f"benchmark-{os.getpid()}.sqlite3")
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        try:
+            report = self.run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def run(self, options):
+        fixture = Fixture(options["users"], options["campaigns"], options["histories"])
+        return {
+            "commit": self.commit(),
+            "database": connection.vendor,
+            "server": "asgi" if settings.ASGI_MODE else "wsgi",
+            "config": {key: options[key] for key in ("users", "campaigns", "histories", "requests", "concurrency")},
+            "scenarios": {name: self.run_scenario(SCENARIOS[name], fixture, options["requests"], options["concurrency"])
+                          for name in options["scenario"] or SCENARIOS},
+        }
+
+    def run_scenario(self, scenario, fixture, requests, concurrency):
+        start = time.perf_counter()
+        if settings.ASGI_MODE:
+            results = asyncio.run(self.send_async(scenario, fixture, requests, concurrency))
+        else:
+            results = self.send_sync(scenario, fixture, requests, concurrency)
+        duration = time.perf_counter() - start
+
+        latencies = sorted(elapsed * 1000 for elapsed, _, _ in results)
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        queries = [count for _, count, _ in results if count is not None]
+        return {
+            "requests": len(results),
+            "errors": sum(not ok for _, _, ok in results),
+            "throughput_rps": round(len(results) / duration, 2),
+            "latency_ms": {"p50": round(percentiles[49], 3), "p95": round(percentiles[94], 3),
+                           "p99": round(percentiles[98], 3)},
+            "queries_per_request": round(statistics.mean(queries), 2) if queries else None,
+        }
+
+    def send_sync(self, scenario, fixture, requests, concurrency):
+        local = threading.local()
+
+        def send(_):
+            if not hasattr(local, "client"):
+                local.client = APIClient()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = scenario(local.client, fixture)
+                elapsed = time.perf_counter() - start
+            return elapsed, len(queries.captured_queries), response.status_code < 400
+
+        if concurrency == 1:
+            return [send(i) for i in range(requests)]
+        with ThreadPoolExecutor(concurrency, initializer=connections.close_all) as pool:
+            return list(pool.map(send, range(requests)))
+
+    async def send_async(self, scenario, fixture, requests, concurrency):
+        """
+        Drive the ASGI handler from one event loop, concurrency requests in
+        flight at a time. Queries run on the async views' pool threads, out of
+        reach of CaptureQueriesContext, so they aren't counted.
+        """
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(_):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await scenario(client, fixture)
+                return time.perf_counter() - start, None, response.status_code < 400
+
+        return await asyncio.gather(*(send(i) for i in range(requests)))
+
+    def commit(self):
+        try:
+            return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.test import override_settings
+from rest_framework.test import APIClient
+from users.models import User
+
+from .benchmark import PASSWORD
+from .benchmark import Command as BenchmarkCommand
+
+
+class Command(BenchmarkCommand):
+    help = ("Measure login throughput per CPU core under each password hashing policy "
+            "of PASSWORD_HASH_POLICIES. Prints the report as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=20,
+                            help="Logins sent under each policy.")
+        parser.add_argument("--policy", action="append", choices=sorted(settings.PASSWORD_HASH_POLICIES),
+                            help="Policy to measure, may be repeated. Defaults to all.")
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+        parser.add_argument("--current-db", action="store_true",
+                            help="Create the users in the configured database instead of a test database.")
+
+    def run(self, options):
+        return {
+            "config": {"pbkdf2_iterations": settings.PASSWORD_PBKDF2_ITERATIONS,
+                       "argon2_time_cost": settings.PASSWORD_ARGON2_TIME_COST,
+                       "argon2_memory_cost": settings.PASSWORD_ARGON2_MEMORY_COST},
+            "policies": {policy: self.measure(policy, options["logins"])
+                         for policy in options["policy"] or settings.PASSWORD_HASH_POLICIES},
+        }
+
+    def measure(self, policy, logins):
+        """
+        Logins run in this process one at a time, so logins per CPU second
+        is the throughput of one core.
+        """
+        hasher = settings.PASSWORD_HASH_POLICIES[policy]
+        with override_settings(PASSWORD_HASHERS=[hasher, *(h for h in settings.PASSWORD_HASHERS if h != hasher)]):
+            user = User.objects.create_user(email=f"login-{policy}@benchmark.test", password=PASSWORD,
+                                            first_name="Login", last_name="Benchmark")
+            client = APIClient()
+            cpu_start, start = time.process_time(), time.perf_counter()
+            errors = sum(client.post("/api/login/", {"email": user.email, "password": PASSWORD},
+                                     format="json").status_code != 200 for _ in range(logins))
+            cpu, duration = time.process_time() - cpu_start, time.perf_counter() - start
+            algorithm = get_hasher().algorithm
+        user.delete()
+        return {
+            "algorithm": algorithm,
+            "logins": logins,
+            "errors": errors,
+            "login_ms": round(duration / logins * 1000, 3),
+            "logins_per_second_per_core": round(logins / cpu, 2),
+        }
@@ -0,0 +1,71 @@
+import io
+import json
+import time
+
+from app.parsers import FastJSONParser, MessagePackParser
+from app.renderers import FastJSONRenderer, MessagePackRenderer
+from campaign.models import Campaign, CampaignStats
+from campaign.serializers import CampaignListSerializer
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from users.models import User
+
+FORMATS = {
+    "json": (JSONRenderer, JSONParser),
+    "fast-json": (FastJSONRenderer, FastJSONParser),
+    "msgpack": (MessagePackRenderer, MessagePackParser),
+}
+
+
+def campaign_page(rows):
+    """
+    A serialized campaign feed page of unsaved campaigns, shaped like the
+    real one, so no database is needed.
+    """
+    now = timezone.now()
+    fundraiser = User(first_name="Fundraiser", last_name="Benchmark", email="fundraiser@benchmark.test")
+    campaigns = []
+    for i in range(rows):
+        campaign = Campaign(id=i + 1, title=f"Campaign {i} – bantu sesama", description="Benchmark campaign " * 20,
+                            amount=i * 1000, target_amount=10 ** 8, created_at=now, status="VERIFIED",
+                            fundraiser=fundraiser, image_url="https://example.com/campaign.png")
+        campaign.stats = CampaignStats(campaign=campaign, donor_count=i, donation_count=i * 2,
+                                       donation_total=i * 20000, last_donation_at=now)
+        campaigns.append(campaign)
+    return {"next": None, "previous": None, "results": CampaignListSerializer(campaigns, many=True).data}
+
+
+class Command(BaseCommand):
+    help = ("Measure the CPU time spent rendering and parsing one campaign feed response "
+            "with each renderer/parser pair. Prints the report as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=50,
+                            help="Times each response is rendered and parsed.")
+
+    def handle(self, *args, **options):
+        data = campaign_page(options["rows"])
+        report = {"rows": options["rows"], "repeat": options["repeat"],
+                  "formats": {name: self.measure(renderer_class(), parser_class(), data, options["repeat"])
+                              for name, (renderer_class, parser_class) in FORMATS.items()}}
+        baseline = report["formats"]["json"]["render_cpu_ms"]
+        for result in report["formats"].values():
+            result["render_cpu_saved_ms"] = round(baseline - result["render_cpu_ms"], 3)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def measure(self, renderer, parser, data, repeat):
+        start = time.process_time()
+        for _ in range(repeat):
+            body = renderer.render(data, renderer.media_type, {})
+        render_cpu = (time.process_time() - start) / repeat
+
+        start = time.process_time()
+        for _ in range(repeat):
+            parser.parse(io.BytesIO(body), parser.media_type, {})
+        parse_cpu = (time.process_time() - start) / repeat
+
+        return {"bytes": len(body), "render_cpu_ms": round(render_cpu * 1000, 3),
+                "parse_cpu_ms": round(parse_cpu * 1000, 3)}
@@ -0,0 +1,73 @@
+import time
+import tracemalloc
+
+from campaign.models import Campaign
+from campaign.serializers import (CampaignListRowSerializer,
+                                  CampaignListSerializer,
+                                  DonationViewRowSerializer,
+                                  DonationViewSerializer,
+                                  WithdrawRequestRowSerializer,
+                                  WithdrawRequestSerializer)
+from wallet.models import DonationHistory, TopUpHistory, WithdrawRequest
+from wallet.serializers import (TopUpRequestListRowSerializer,
+                                TopUpRequestListSerializer)
+
+from .benchmark import Command as BenchmarkCommand
+from .benchmark import Fixture
+
+# name: (queryset, ModelSerializer, RowSerializer). The querysets join what
+# the ModelSerializer reads, so neither side pays for N+1 queries.
+PAIRS = {
+    "campaigns": (lambda: Campaign.objects.with_fundraiser().with_stats().filter(status="VERIFIED"),
+                  CampaignListSerializer, CampaignListRowSerializer),
+    "donations": (lambda: DonationHistory.objects.select_related("campaign"),
+                  DonationViewSerializer, DonationViewRowSerializer),
+    "withdraws": (lambda: WithdrawRequest.objects.select_related("campaign"),
+                  WithdrawRequestSerializer, WithdrawRequestRowSerializer),
+    "topups": (lambda: TopUpHistory.objects.select_related("user"),
+               TopUpRequestListSerializer, TopUpRequestListRowSerializer),
+}
+
+
+class Command(BenchmarkCommand):
+    help = ("Seed a throwaway database and compare the CPU time and memory allocated per row "
+            "of each list ModelSerializer and its row serializer. Prints the report as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=10,
+                            help="Times each list is fetched and serialized.")
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+        parser.add_argument("--current-db", action="store_true",
+                            help="Seed the configured database instead of creating a test database.")
+
+    def run(self, options):
+        rows = options["rows"]
+        Fixture(users=max(rows // 10, 10), campaigns=rows, histories=rows)
+        report = {"rows": rows, "repeat": options["repeat"], "serializers": {}}
+        for name, (queryset, serializer_class, row_serializer_class) in PAIRS.items():
+            model = self.measure(lambda: serializer_class(queryset()[:rows], many=True).data, options["repeat"])
+            row = self.measure(lambda: row_serializer_class(
+                row_serializer_class.rows(queryset()[:rows]), many=True).data, options["repeat"])
+            report["serializers"][name] = {
+                "model_serializer": model, "row_serializer": row,
+                "cpu_factor": round(model["cpu_us_per_row"] / row["cpu_us_per_row"], 2),
+                "alloc_factor": round(model["alloc_bytes_per_row"] / row["alloc_bytes_per_row"], 2),
+            }
+        return report
+
+    def measure(self, serialize, repeat):
+        """
+        CPU time per row, querying included, and the peak memory allocated
+        while serializing one list.
+        """
+        start = time.process_time()
+        for _ in range(repeat):
+            count = len(serialize())
+        cpu = (time.process_time() - start) / repeat
+
+        tracemalloc.start()
+        serialize()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"cpu_us_per_row": round(cpu / count * 10 ** 6, 2), "alloc_bytes_per_row": peak // count}
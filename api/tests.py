@@ -0,0 +1,247 @@
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+import msgpack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from app.async_views import as_async_view
+from app.parsers import FastJSONParser
+from app.renderers import FastJSONRenderer
+from asgiref.sync import async_to_sync
+from campaign.models import Campaign
+from campaign.views import CampaignList
+from django.test import (AsyncRequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import path
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import views
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework_simplejwt.tokens import RefreshToken
+from users.models import User
+from wallet.models import DonationHistory
+
+
+class SlowView(views.APIView):
+    authentication_classes = ()
+    permission_classes = ()
+
+    def get(self, request):
+        time.sleep(0.5)
+        return Response({"slow": True})
+
+
+urlpatterns = [path("slow/", as_async_view(SlowView))]
+
+# settings.MIDDLEWARE as it is with SERVER_MODE=asgi and REQUEST_TIMING on.
+ASGI_MIDDLEWARE = ["app.middleware.RequestTimingMiddleware", *(
+    middleware for middleware in settings.MIDDLEWARE
+    if middleware != "whitenoise.middleware.WhiteNoiseMiddleware")]
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_benchmark_report(self):
+        out = StringIO()
+        call_command("benchmark", "--current-db", "--users", "5", "--campaigns", "5", "--histories", "5",
+                     "--requests", "3", "--concurrency", "1", stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(set(report["scenarios"]), {
+                         "campaigns", "campaign-donor-id", "donate", "donate-token", "donation", "topup-verify"})
+        for result in report["scenarios"].values():
+            self.assertEqual(result["requests"], 3)
+            self.assertEqual(result["errors"], 0)
+            self.assertEqual(set(result["latency_ms"]), {"p50", "p95", "p99"})
+            self.assertGreater(result["queries_per_request"], 0)
+
+    def test_benchmark_renderers_report(self):
+        out = StringIO()
+        call_command("benchmark_renderers", "--rows", "10", "--repeat", "2", stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(set(report["formats"]), {"json", "fast-json", "msgpack"})
+        self.assertEqual(report["formats"]["json"]["bytes"], report["formats"]["fast-json"]["bytes"])
+
+    def test_benchmark_serializers_report(self):
+        out = StringIO()
+        call_command("benchmark_serializers", "--current-db", "--rows", "10", "--repeat", "1", stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(set(report["serializers"]), {"campaigns", "donations", "withdraws", "topups"})
+        for result in report["serializers"].values():
+            self.assertGreater(result["cpu_factor"], 0)
+            self.assertGreater(result["row_serializer"]["alloc_bytes_per_row"], 0)
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_benchmark_logins_report(self):
+        out = StringIO()
+        call_command("benchmark_logins", "--current-db", "--logins", "2", "--policy", "pbkdf2", stdout=out)
+        report = json.loads(out.getvalue())
+
+        result = report["policies"]["pbkdf2"]
+        self.assertEqual(result["algorithm"], "pbkdf2_sha256")
+        self.assertEqual(result["errors"], 0)
+        self.assertGreater(result["logins_per_second_per_core"], 0)
+
+
+class RendererTests(TestCase):
+    DATA = {
+        "results": [{"id": 1, "title": "Bantu – sesama \u2028", "amount": Decimal("1.50"),
+                     "created_at": datetime.datetime(2021, 9, 1, 8, 30, 15, 123456, tzinfo=timezone.utc),
+                     "date": datetime.date(2021, 9, 1), "empty": None}],
+        "next": None,
+    }
+
+    def test_fast_json_matches_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.DATA), JSONRenderer().render(self.DATA))
+        self.assertEqual(FastJSONRenderer().render(self.DATA, "application/json; indent=4"),
+                         JSONRenderer().render(self.DATA, "application/json; indent=4"))
+
+    def test_fast_json_parser(self):
+        body = FastJSONRenderer().render({"amount": 5000, "password": "tester41"})
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), {"amount": 5000, "password": "tester41"})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b"{"))
+
+    def test_msgpack_negotiation(self):
+        response = self.client.get("/api/campaigns/", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content),
+                         json.loads(self.client.get("/api/campaigns/").content))
+
+    def test_msgpack_request_body(self):
+        User.objects.create_user(email="pack@test.com", password="tester41", first_name="P", last_name="K")
+        response = self.client.post(
+            "/api/login/", msgpack.packb({"email": "pack@test.com", "password": "tester41"}),
+            content_type="application/msgpack", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", msgpack.unpackb(response.content))
+
+        response = self.client.post("/api/login/", b"\xc1", content_type="application/msgpack")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MIDDLEWARE=["app.middleware.RequestTimingMiddleware", *settings.MIDDLEWARE])
+class RequestTimingMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_timing_header_and_log(self):
+        with self.assertLogs("app.timing", level="INFO") as logs:
+            response = self.client.get("/api/campaigns/")
+
+        self.assertEqual(response.status_code, 200)
+        timings = dict(part.split(";", 1)
+                       for part in response["Server-Timing"].split(", "))
+        self.assertEqual(set(timings), {"db", "view", "render", "total"})
+        # Feed version for the ETag, then the page itself.
+        self.assertIn('desc="2 queries"', timings["db"])
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["url_name"], "campaigns")
+        self.assertEqual(line["queries"], 2)
+        self.assertGreater(line["total_ms"], 0)
+
+
+@override_settings(ROOT_URLCONF="api.tests", MIDDLEWARE=ASGI_MIDDLEWARE)
+class AsgiMiddlewareTests(SimpleTestCase):
+    def test_middleware_is_async_capable(self):
+        for middleware in ASGI_MIDDLEWARE:
+            self.assertTrue(getattr(import_string(middleware), "async_capable", False), middleware)
+
+    async def test_slow_requests_run_concurrently(self):
+        start = time.perf_counter()
+        with self.assertLogs("app.timing", level="INFO") as logs:
+            responses = await asyncio.gather(*(self.async_client.get("/slow/") for _ in range(4)))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual([response.status_code for response in responses], [200] * 4)
+        # One request at a time would take 4 x 0.5 s.
+        self.assertLess(elapsed, 1.0)
+        self.assertNotIn("db;", responses[0]["Server-Timing"])
+        self.assertIsNone(json.loads(logs.records[0].getMessage())["queries"])
+
+
+# The wrapped view queries from a pool thread with its own connection, which
+# can't see the data of a TestCase transaction.
+class AsyncViewTests(TransactionTestCase):
+    async def test_async_campaign_list(self):
+        view = as_async_view(CampaignList)
+        response = await view(AsyncRequestFactory().get("/api/campaigns/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["results"], [])
+
+    def test_async_view_sees_committed_rows(self):
+        fundraiser = User.objects.create_user(
+            email="async@test.com", password="tester41", first_name="A", last_name="B",
+            role="FUNDRAISER", proposal_text="proposal")
+        Campaign.objects.create(title="Async", description="d", target_amount=10,
+                                status="VERIFIED", fundraiser=fundraiser)
+
+        view = async_to_sync(as_async_view(CampaignList))
+        response = view(AsyncRequestFactory().get("/api/campaigns/"))
+        self.assertEqual([c["title"] for c in json.loads(response.content)["results"]], ["Async"])
+
+
+async def asgi_get(application, path, headers=()):
+    """
+    Send a GET for path to an ASGI application, return the messages it sent.
+    """
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"testserver"), *headers],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    requests = [{"type": "http.request", "body": b"", "more_body": False}]
+    messages = []
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages
+
+
+# Rows are read by a pool thread, which can't see a TestCase transaction.
+class AsgiExportTests(TransactionTestCase):
+    def test_export_streams_through_asgi_application(self):
+        with mock.patch.dict(os.environ):
+            application = importlib.import_module("app.asgi").application
+        donor = User.objects.create_user(
+            email="export@test.com", password="tester41", first_name="A", last_name="B", role="DONATUR")
+        fundraiser = User.objects.create_user(
+            email="fund@test.com", password="tester41", first_name="C", last_name="D",
+            role="FUNDRAISER", proposal_text="proposal")
+        campaign = Campaign.objects.create(title="Export", description="d", target_amount=10,
+                                           status="VERIFIED", fundraiser=fundraiser)
+        DonationHistory.objects.bulk_create(
+            DonationHistory(user=donor, campaign=campaign, amount=amount) for amount in (100, 200, 300))
+        token = RefreshToken.for_user(donor).access_token
+
+        messages = async_to_sync(asgi_get)(application, "/api/donate/export/", [
+            (b"authorization", f"Bearer {token}".encode())])
+
+        self.assertEqual(messages[0]["status"], 200)
+        body = b"".join(message.get("body", b"") for message in messages[1:]).decode()
+        lines = body.splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(sorted(line.split(",")[-1] for line in lines[1:]), ["100", "200", "300"])
+        self.assertNotIn("more_body", messages[-1])
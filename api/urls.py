@@ -1,16 +1,18 @@
+from app.async_views import view_for_server
 from django.urls import include, path
-from rest_framework_simplejwt.views import (TokenObtainPairView,
-                                            TokenRefreshView)
-from users.views import FundraiserRequestView, MeView, RegisterView, FundraiserRequestByIdView
+from users.views import (FundraiserRequestByIdView, FundraiserRequestView,
+                         LoginView, MeView, RefreshView, RegisterView,
+                         UserImportView)
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
-    path('login/', TokenObtainPairView.as_view(), name='login'),
-    path('refresh/', TokenRefreshView.as_view(), name="refresh"),
+    path('login/', LoginView.as_view(), name='login'),
+    path('refresh/', RefreshView.as_view(), name="refresh"),
     path('admin/fundraiser-requests/',
          FundraiserRequestView.as_view(), name="fundraiser-requests"),
     path('admin/fundraiser-requests/<int:pk>/', FundraiserRequestByIdView.as_view(), name='fundraiser-request-id'),
-    path('me/', MeView.as_view(), name="me"),
+    path('admin/users/import/', UserImportView.as_view(), name='users-import'),
+    path('me/', view_for_server(MeView), name="me"),
     path('', include('campaign.urls')),
     path('', include('wallet.urls'))
 ]
@@ -9,8 +9,18 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+from app.handlers import StreamingASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+os.environ.setdefault('SERVER_MODE', 'asgi')
+
+# As get_asgi_application(), with a handler streaming the history exports
+# from a worker thread instead of the event loop.
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+# Static files are served here rather than by WhiteNoise, which would force
+# the middleware chain into sync mode (see settings.ASGI_MODE).
+application = ASGIStaticFilesHandler(StreamingASGIHandler())
@@ -0,0 +1,46 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+# Shared by every async view, so at most ASGI_THREAD_POOL_SIZE requests hold a
+# database connection at once while the event loop keeps serving slow clients.
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASGI_THREAD_POOL_SIZE, thread_name_prefix="async-view")
+
+
+def as_async_view(view_class, **initkwargs):
+    """
+    Async Django view running a DRF view_class in the bounded thread pool.
+    The view, its queries and the response rendering all happen in the pool.
+    """
+    view = view_class.as_view(**initkwargs)
+
+    def run(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    run_in_pool = sync_to_async(run, thread_sensitive=False, executor=executor)
+
+    @functools.wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await run_in_pool(request, *args, **kwargs)
+
+    return async_view
+
+
+def view_for_server(view_class, **initkwargs):
+    """
+    as_async_view() when serving through ASGI, the plain DRF view otherwise.
+    """
+    if settings.ASGI_MODE:
+        return as_async_view(view_class, **initkwargs)
+    return view_class.as_view(**initkwargs)
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGIHandler iterating streaming responses in a worker thread. Django 3.2
+    iterates them on the event loop, where the lazy querysets of the history
+    exports raise SynchronousOnlyOperation after the headers are sent, and
+    where any blocking iterator would stall every other request.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append(
+                (b'Set-Cookie', c.output(header='').encode('ascii').strip()))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+        parts = iterate_in_thread(response)
+        try:
+            async for part in parts:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            await parts.aclose()
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+async def iterate_in_thread(iterable):
+    """
+    Yield the items of a sync iterable, iterated from start to end in one
+    thread of the async view pool, so its database connection and cursor
+    stay the same. At most one item waits ahead of the consumer.
+    """
+    from app.async_views import executor
+
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue(maxsize=1)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(items.put(item), loop).result()
+
+    def produce():
+        close_old_connections()
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                put(item)
+        finally:
+            close_old_connections()
+            if not stop.is_set():
+                put(done)
+
+    producer = loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            item = await items.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        # The consumer may stop early (client gone): free the slot the
+        # producer could be waiting on and let it finish.
+        stop.set()
+        while not items.empty():
+            items.get_nowait()
+        await producer
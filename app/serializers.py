@@ -0,0 +1,64 @@
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+# Shared, unbound field used to format datetimes exactly like ModelSerializer.
+DATETIME = serializers.DateTimeField()
+
+
+def full_name(first_name, last_name):
+    """
+    AbstractUser.get_full_name() of a row's name columns.
+    """
+    return f"{first_name} {last_name}".strip()
+
+
+class RowSerializer:
+    """
+    Output-only serializer of .values() rows. Subclasses list the columns
+    they read and build each item in to_representation(row), producing the
+    same data as their ModelSerializer counterpart without building model
+    instances or per-row field objects.
+    """
+    columns = ()
+
+    def __init__(self, instance=None, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @classmethod
+    def rows(cls, queryset, *extra_columns):
+        return queryset.values(*cls.columns, *extra_columns)
+
+    def to_representation(self, row):
+        raise NotImplementedError
+
+    @property
+    def data(self):
+        if self.many:
+            return ReturnList(map(self.to_representation, self.instance), serializer=self)
+        return ReturnDict(self.to_representation(self.instance), serializer=self)
+
+
+class RowListMixin:
+    """
+    List through row_serializer_class. serializer_class stays in use for
+    everything else, such as writes and the browsable API forms.
+    """
+    row_serializer_class = None
+
+    def get_row_columns(self):
+        """
+        Extra columns to select, e.g. the field a cursor paginator reads.
+        """
+        return ()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.row_serializer_class.rows(queryset, *self.get_row_columns())
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.row_serializer_class(page, many=True).data)
+        return Response(self.row_serializer_class(rows, many=True).data)
@@ -64,6 +64,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Opt-in per-request query count and timing (Server-Timing header + log line).
+if os.environ.get("REQUEST_TIMING", "").lower() in ("true", "t", "1"):
+    MIDDLEWARE.insert(0, 'app.middleware.RequestTimingMiddleware')
+
 ROOT_URLCONF = 'app.urls'
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -85,6 +89,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+# "asgi" when served by app.asgi: the read-heavy endpoints then run as async
+# views, doing their database work in a pool of ASGI_THREAD_POOL_SIZE threads.
+ASGI_MODE = os.environ.get("SERVER_MODE", "wsgi").lower() == "asgi"
+ASGI_THREAD_POOL_SIZE = int(os.environ.get("ASGI_THREAD_POOL_SIZE", 8))
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -118,6 +127,35 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing. PASSWORD_HASH_POLICY picks the hasher of new passwords;
+# the others still verify existing hashes, which Django rehashes with the
+# policy's hasher on the next successful login. Changing the PBKDF2 or argon2
+# cost below rehashes the same way.
+PASSWORD_HASH_POLICIES = {
+    "pbkdf2": "users.hashers.TunedPBKDF2PasswordHasher",
+    "argon2": "users.hashers.TunedArgon2PasswordHasher",
+}
+PASSWORD_HASH_POLICY = os.environ.get("PASSWORD_HASH_POLICY", "pbkdf2")
+PASSWORD_HASHERS = [
+    PASSWORD_HASH_POLICIES[PASSWORD_HASH_POLICY],
+    *(hasher for policy, hasher in PASSWORD_HASH_POLICIES.items() if policy != PASSWORD_HASH_POLICY),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.environ.get("PASSWORD_PBKDF2_ITERATIONS", 260000))
+PASSWORD_ARGON2_TIME_COST = int(
+    os.environ.get("PASSWORD_ARGON2_TIME_COST", 2))
+PASSWORD_ARGON2_MEMORY_COST = int(
+    os.environ.get("PASSWORD_ARGON2_MEMORY_COST", 102400))
+
+# Password hashing processes of the admin user import endpoint. 1 hashes in
+# the web worker itself; the import_users command uses every CPU instead.
+USER_IMPORT_WORKERS = int(os.environ.get("USER_IMPORT_WORKERS", 1))
+# Rows accepted per upload by that endpoint, so hashing them fits in the
+# gunicorn timeout (about 0.1 s per PBKDF2 hash per worker). Larger files go
+# through the import_users command.
+USER_IMPORT_MAX_ROWS = int(os.environ.get("USER_IMPORT_MAX_ROWS", 200))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -149,13 +187,73 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.BasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.UserClaimsJWTAuthentication",
+    ],
+    # orjson backed JSON, plus MessagePack for clients sending
+    # Accept/Content-Type: application/msgpack.
+    "DEFAULT_RENDERER_CLASSES": [
+        "app.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "app.renderers.MessagePackRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "app.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+        "app.parsers.MessagePackParser",
     ],
 }
 
+# Opt-in: trust the role/verified/is_active claims of the JWT on read-only
+# requests instead of selecting the user row on every request. A changed or
+# deleted user then keeps its access until the token expires.
+JWT_USER_CLAIMS_AUTH = os.environ.get(
+    "JWT_USER_CLAIMS_AUTH", "0").lower() in ("true", "t", "1")
+
+CAMPAIGN_PAGE_SIZE = int(os.environ.get("CAMPAIGN_PAGE_SIZE", 20))
+CAMPAIGN_MAX_PAGE_SIZE = int(os.environ.get("CAMPAIGN_MAX_PAGE_SIZE", 100))
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", 50))
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get("HISTORY_MAX_PAGE_SIZE", 200))
+# Seconds a reverse proxy may serve the public campaign feed before revalidating.
+CAMPAIGN_FEED_MAX_AGE = int(os.environ.get("CAMPAIGN_FEED_MAX_AGE", 5))
+# Seconds a rendered feed page is kept in the cache. Pages are keyed by the
+# feed version, so this only bounds memory, never staleness.
+CAMPAIGN_FEED_CACHE_TIMEOUT = int(
+    os.environ.get("CAMPAIGN_FEED_CACHE_TIMEOUT", 300))
+
+# Seconds the admin notification counters may be served from cache.
+NOTIFICATION_COUNT_CACHE_TIMEOUT = int(
+    os.environ.get("NOTIFICATION_COUNT_CACHE_TIMEOUT", 10))
+
 SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15)
 }
 
+# How long a donation token from api/donor/donation-token/ stands in for the
+# password when donating.
+DONATION_TOKEN_LIFETIME = timedelta(
+    minutes=int(os.environ.get("DONATION_TOKEN_LIFETIME_MINUTES", 10)))
+# Ledger entries younger than this many seconds are left out of wallet
+# snapshots, so a transaction still open when a snapshot is taken can't commit
+# an entry behind it.
+WALLET_SNAPSHOT_LAG_SECONDS = int(os.environ.get("WALLET_SNAPSHOT_LAG_SECONDS", 60))
+# How long the response to a POST with an Idempotency-Key is replayed to
+# retries, until purge_idempotency_keys deletes it.
+IDEMPOTENCY_KEY_TTL = timedelta(
+    hours=int(os.environ.get("IDEMPOTENCY_KEY_TTL_HOURS", 24)))
+# Seconds before a retry may take over a key whose request never finished.
+# Keep it above the gunicorn worker timeout.
+IDEMPOTENCY_KEY_LEASE_SECONDS = int(os.environ.get("IDEMPOTENCY_KEY_LEASE_SECONDS", 60))
+
 django_heroku.settings(locals())
+
+if ASGI_MODE:
+    # WhiteNoise 5 is sync-only, and a single sync middleware makes Django run
+    # the whole chain, view included, on its one thread-sensitive thread.
+    # app/asgi.py serves static files in front of the middleware instead.
+    MIDDLEWARE = [middleware for middleware in MIDDLEWARE
+                  if middleware != "whitenoise.middleware.WhiteNoiseMiddleware"]
+    STATICFILES_STORAGE = "django.contrib.staticfiles.storage.StaticFilesStorage"
+
+LOGGING["loggers"]["app.timing"] = {"handlers": ["console"], "level": "INFO"}
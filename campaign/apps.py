@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CampaignConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'campaign'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals
+        post_migrate.connect(signals.search_index_migrated, sender=self)
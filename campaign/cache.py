@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from users.models import User
+from wallet.models import TopUpHistory, WithdrawRequest
+
+from .models import Campaign
+
+NOTIFICATION_COUNT_KEY = "campaign:notification-count"
+FEED_PAGE_KEY = "campaign:feed:{}"
+FEED_HITS_KEY = "campaign:feed-hits"
+FEED_MISSES_KEY = "campaign:feed-misses"
+
+
+def get_notification_counts():
+    """
+    Pending item counts for the admin dashboard, served from one cache entry.
+    The entry is dropped by signals whenever one of the counted rows changes
+    and otherwise expires after NOTIFICATION_COUNT_CACHE_TIMEOUT seconds.
+    """
+    counts = cache.get(NOTIFICATION_COUNT_KEY)
+    if counts is None:
+        counts = {
+            "top_up": TopUpHistory.objects.filter(status="PENDING").count(),
+            "fundraiser_request": User.objects.filter(role="FUNDRAISER", verified=False).count(),
+            "new_campaign": Campaign.objects.filter(status="PENDING").count(),
+            "withdraw_request": WithdrawRequest.objects.filter(status="PENDING").count(),
+        }
+        cache.set(NOTIFICATION_COUNT_KEY, counts,
+                  settings.NOTIFICATION_COUNT_CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_notification_counts():
+    cache.delete(NOTIFICATION_COUNT_KEY)
+
+
+def _incr(key):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr, the count restarts.
+        cache.set(key, 1, None)
+
+
+def get_feed_page(version_key):
+    """
+    Cached rows and cursors of a feed page. version_key must change whenever a
+    write to the feed commits (see FeedVersion), so an entry is never served
+    after a newer write.
+    """
+    data = cache.get(FEED_PAGE_KEY.format(version_key))
+    _incr(FEED_MISSES_KEY if data is None else FEED_HITS_KEY)
+    return data
+
+
+def set_feed_page(version_key, data):
+    cache.set(FEED_PAGE_KEY.format(version_key), data,
+              settings.CAMPAIGN_FEED_CACHE_TIMEOUT)
+
+
+def get_feed_cache_stats():
+    hits = cache.get(FEED_HITS_KEY, 0)
+    misses = cache.get(FEED_MISSES_KEY, 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0}
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from wallet.models import DonationHistory
+
+from campaign.models import Campaign, CampaignStats, FeedVersion
+from campaign.stats import EMPTY_STATS, expected_stats, rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild CampaignStats from DonationHistory, or report drift with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only compare the stored stats with DonationHistory and report drift.")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            expected = expected_stats(DonationHistory)
+            stored = {stats.campaign_id: {field: getattr(stats, field) for field in EMPTY_STATS}
+                      for stats in CampaignStats.objects.all()}
+            drifted = sorted(campaign_id for campaign_id in expected.keys() | stored.keys()
+                             if expected.get(campaign_id, EMPTY_STATS) != stored.get(campaign_id, EMPTY_STATS))
+            for campaign_id in drifted:
+                self.stdout.write(
+                    f"campaign {campaign_id}: stored {stored.get(campaign_id)}, expected {expected.get(campaign_id)}")
+            if drifted:
+                raise CommandError(f"{len(drifted)} campaign(s) drifted.")
+            self.stdout.write(self.style.SUCCESS("Campaign stats are in sync."))
+            return
+
+        with transaction.atomic():
+            count = rebuild_stats(Campaign, CampaignStats, DonationHistory)
+            FeedVersion.bump_on_commit()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats for {count} campaign(s)."))
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-17 20:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0006_alter_campaign_status'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='campaign',
+            options={'ordering': ('-created_at', '-id')},
+        ),
+    ]
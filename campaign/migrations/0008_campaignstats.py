@@ -0,0 +1,36 @@
+# Generated by Django 3.2.6 on 2026-10-17 20:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from campaign.stats import rebuild_stats
+
+
+def backfill_stats(apps, schema_editor):
+    rebuild_stats(apps.get_model('campaign', 'Campaign'), apps.get_model('campaign', 'CampaignStats'),
+                  apps.get_model('wallet', 'DonationHistory'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0007_alter_campaign_options'),
+        ('wallet', '0005_auto_20210813_2250'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignStats',
+            fields=[
+                ('campaign', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='campaign.campaign')),
+                ('donor_count', models.PositiveIntegerField(default=0)),
+                ('donation_count', models.PositiveIntegerField(default=0)),
+                ('donation_total', models.PositiveBigIntegerField(default=0)),
+                ('last_donation_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'campaign stats',
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
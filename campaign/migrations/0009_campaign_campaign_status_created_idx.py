@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0008_campaignstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='campaign_status_created_idx'),
+        ),
+    ]
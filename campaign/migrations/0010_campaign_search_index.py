@@ -0,0 +1,61 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE campaign_campaign_fts USING fts5(
+        title, description, content='campaign_campaign', content_rowid='id')""",
+    """CREATE TRIGGER campaign_campaign_fts_insert AFTER INSERT ON campaign_campaign BEGIN
+        INSERT INTO campaign_campaign_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER campaign_campaign_fts_delete AFTER DELETE ON campaign_campaign BEGIN
+        INSERT INTO campaign_campaign_fts(campaign_campaign_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER campaign_campaign_fts_update AFTER UPDATE OF title, description ON campaign_campaign BEGIN
+        INSERT INTO campaign_campaign_fts(campaign_campaign_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO campaign_campaign_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    "INSERT INTO campaign_campaign_fts(campaign_campaign_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS campaign_campaign_fts_update",
+    "DROP TRIGGER IF EXISTS campaign_campaign_fts_delete",
+    "DROP TRIGGER IF EXISTS campaign_campaign_fts_insert",
+    "DROP TABLE IF EXISTS campaign_campaign_fts",
+]
+
+POSTGRESQL_FORWARD = [
+    """ALTER TABLE campaign_campaign ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')) STORED""",
+    "CREATE INDEX campaign_search_vector_idx ON campaign_campaign USING GIN (search_vector)",
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS campaign_search_vector_idx",
+    "ALTER TABLE campaign_campaign DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql, params=None)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0009_campaign_campaign_status_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRESQL_FORWARD}),
+            run({"sqlite": SQLITE_REVERSE, "postgresql": POSTGRESQL_REVERSE}),
+        ),
+    ]
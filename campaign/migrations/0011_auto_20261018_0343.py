@@ -0,0 +1,44 @@
+# Generated by Django 3.2.6 on 2026-10-17 20:43
+
+from django.db import migrations, models
+
+
+def backfill_progress(apps, schema_editor):
+    Campaign = apps.get_model('campaign', 'Campaign')
+    Campaign.objects.exclude(target_amount=0).update(progress=models.ExpressionWrapper(
+        models.F('amount') * models.Value(1.0) / models.F('target_amount'), output_field=models.FloatField()))
+
+
+def backfill_remaining_amount(apps, schema_editor):
+    Campaign = apps.get_model('campaign', 'Campaign')
+    Campaign.objects.update(remaining_amount=models.F('target_amount') - models.F('amount'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0010_campaign_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='progress',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='remaining_amount',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+        migrations.RunPython(backfill_remaining_amount, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['status', '-progress', '-id'], name='campaign_status_progress_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['status', 'remaining_amount', 'id'], name='campaign_status_remaining_idx'),
+        ),
+    ]
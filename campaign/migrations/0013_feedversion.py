@@ -0,0 +1,26 @@
+# Generated by Django 3.2.6 on 2026-10-17 21:27
+
+from django.db import migrations, models
+
+
+def create_feed_version(apps, schema_editor):
+    FeedVersion = apps.get_model('campaign', 'FeedVersion')
+    FeedVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0012_auto_20261018_0346'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_feed_version, migrations.RunPython.noop),
+    ]
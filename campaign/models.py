@@ -1,4 +1,28 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Value, When
+from django.utils import timezone
+
+
+def funding_progress(amount):
+    """
+    SQL expression of amount / target_amount, 0 for campaigns without a target.
+    """
+    return Case(
+        When(target_amount=0, then=Value(0.0)),
+        default=ExpressionWrapper(amount * Value(1.0) / F("target_amount"), output_field=FloatField()),
+        output_field=FloatField())
+
+
+class CampaignQuerySet(models.QuerySet):
+    def with_fundraiser(self):
+        """
+        Join the fundraiser row so serializers reading its name and email
+        don't fire one query per campaign.
+        """
+        return self.select_related("fundraiser")
+
+    def with_stats(self):
+        return self.select_related("stats")
 
 
 class Campaign(models.Model):
@@ -10,6 +34,7 @@ class Campaign(models.Model):
     target_amount = models.PositiveIntegerField(default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     status = models.CharField(max_length=255, choices=(
         ("PENDING", "PENDING"), ("VERIFIED", "VERIFIED"), ("REJECTED", "REJECTED"), ("STOPPED", "STOPPED")), default="PENDING")
@@ -22,18 +47,159 @@ class Campaign(models.Model):
     withdraw_amount = models.PositiveIntegerField(
         verbose_name="Withdrawn Amount", default=0)
 
+    # amount / target_amount and target_amount - amount, stored so the feed
+    # can be sorted by an index.
+    progress = models.FloatField(default=0, editable=False)
+    remaining_amount = models.IntegerField(default=0, editable=False)
+
+    objects = CampaignQuerySet.as_manager()
+
     class Meta:
-        ordering = ('-created_at', )
+        ordering = ('-created_at', '-id')
+        indexes = [
+            models.Index(fields=['status', '-created_at', '-id'],
+                         name='campaign_status_created_idx'),
+            models.Index(fields=['status', '-progress', '-id'],
+                         name='campaign_status_progress_idx'),
+            models.Index(fields=['status', 'remaining_amount', 'id'],
+                         name='campaign_status_remaining_idx'),
+            models.Index(fields=['status', 'updated_at'],
+                         name='campaign_status_updated_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.progress = self.amount / self.target_amount if self.target_amount else 0
+        self.remaining_amount = self.target_amount - self.amount
+        super().save(*args, **kwargs)
 
     def verify(self):
         if self.status == "PENDING":
             self.status = "VERIFIED"
-            self.save()
+            self.save_status()
 
     def stop(self):
         if self.status == "VERIFIED":
             self.status = "STOPPED"
-            self.save()
+            self.save_status()
+
+    def save_status(self):
+        """
+        Write only the status, so a donation or withdraw committed since this
+        instance was loaded keeps its amounts.
+        """
+        self.save(update_fields=["status", "updated_at"])
+
+    def donate(self, user, amount):
+        """
+        Move amount from the user's wallet to this campaign in one transaction.
+        The balance check happens in the UPDATE itself, so concurrent donations
+        can neither overdraw the wallet nor lose each other's increments.
+        Returns the DonationHistory, or None when the wallet is too low.
+        """
+        from users.models import User
+        from wallet.models import (DonationHistory, LedgerEntry,
+                                   campaign_account, wallet_account)
+
+        with transaction.atomic():
+            debited = User.objects.filter(pk=user.pk, wallet_amount__gte=amount).update(
+                wallet_amount=F("wallet_amount") - amount)
+            if not debited:
+                return None
+            Campaign.objects.filter(pk=self.pk).update(
+                amount=F("amount") + amount, progress=funding_progress(F("amount") + amount),
+                remaining_amount=F("remaining_amount") - amount, updated_at=timezone.now())
+            is_new_donor = not DonationHistory.objects.filter(
+                campaign=self, user=user).exists()
+            donation = DonationHistory.objects.create(
+                user=user, campaign=self, amount=amount)
+            CampaignStats.record_donation(donation, is_new_donor)
+            LedgerEntry.post(LedgerEntry.transfer(
+                "DONATION", donation.pk, amount, wallet_account(user.pk), campaign_account(self.pk)))
+            FeedVersion.bump_on_commit()
+            return donation
+
+    def request_withdraw(self, user, amount):
+        """
+        Reserve amount of the donations to this campaign for a withdraw by
+        user. As in donate(), the check against what is left happens in the
+        UPDATE itself. Returns the WithdrawRequest, or None when less than
+        amount is left.
+        """
+        from wallet.models import HOLD, LedgerEntry, WithdrawRequest, campaign_account
+
+        with transaction.atomic():
+            reserved = Campaign.objects.filter(pk=self.pk, amount__gte=F("withdraw_amount") + amount).update(
+                withdraw_amount=F("withdraw_amount") + amount, updated_at=timezone.now())
+            if not reserved:
+                return None
+            withdraw = WithdrawRequest.objects.create(
+                user=user, campaign=self, amount=amount)
+            LedgerEntry.post(LedgerEntry.transfer(
+                "WITHDRAW_REQUEST", withdraw.pk, amount, campaign_account(self.pk), HOLD))
+            return withdraw
 
     def __str__(self):
         return f"{self.title}, {self.created_at}"
+
+
+class CampaignStats(models.Model):
+    """
+    Donor statistics of a campaign, maintained incrementally by
+    Campaign.donate() and rebuilt by the rebuild_campaign_stats command.
+    """
+    campaign = models.OneToOneField(
+        Campaign, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+
+    donor_count = models.PositiveIntegerField(default=0)
+    donation_count = models.PositiveIntegerField(default=0)
+    donation_total = models.PositiveBigIntegerField(default=0)
+    last_donation_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "campaign stats"
+
+    @property
+    def average_donation(self):
+        if not self.donation_count:
+            return 0
+        return self.donation_total // self.donation_count
+
+    @classmethod
+    def record_donation(cls, donation, is_new_donor):
+        cls.objects.get_or_create(campaign_id=donation.campaign_id)
+        cls.objects.filter(campaign_id=donation.campaign_id).update(
+            donor_count=F("donor_count") + int(is_new_donor),
+            donation_count=F("donation_count") + 1,
+            donation_total=F("donation_total") + donation.amount,
+            last_donation_at=donation.date)
+
+    def __str__(self):
+        return f"{self.campaign_id} {self.donor_count} donors"
+
+
+class FeedVersion(models.Model):
+    """
+    Single row counting the writes to the campaign feed, which keys the
+    cached feed pages and ETags. Writes bump it once they have committed:
+    bumping inside their transaction would lock the row until the commit and
+    serialize every donation. A page read in between is cached under the
+    version it was read with, which no request asks for after the bump.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(version=F("version") + 1):
+            cls.objects.get_or_create(pk=1)
+            cls.objects.filter(pk=1).update(version=F("version") + 1)
+
+    @classmethod
+    def bump_on_commit(cls):
+        transaction.on_commit(cls.bump)
+
+    def __str__(self):
+        return f"feed version {self.version}"
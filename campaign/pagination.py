@@ -0,0 +1,37 @@
+from urllib import parse
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class CampaignCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the public campaign feed.
+    Pages are sliced on (-created_at, -id), so cursors stay stable while new
+    campaigns are inserted at the head of the feed. Views can slice on another
+    unique ordering by setting `feed_ordering`.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = settings.CAMPAIGN_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.CAMPAIGN_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, "feed_ordering", self.ordering)
+
+    def get_cursor(self, link):
+        """
+        Cursor parameter of a next or previous link, None for no link.
+        """
+        if link is None:
+            return None
+        return parse.parse_qs(parse.urlsplit(link).query)[self.cursor_query_param][0]
+
+    def get_link(self, request, cursor):
+        """
+        Next or previous link of this request for a cursor from get_cursor().
+        """
+        if cursor is None:
+            return None
+        return replace_query_param(request.build_absolute_uri(), self.cursor_query_param, cursor)
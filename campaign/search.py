@@ -0,0 +1,93 @@
+import re
+
+from django.db import connection, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# Full-text index over Campaign.title and Campaign.description, created by
+# migration 0010: an FTS5 table kept in sync by triggers on SQLite and a
+# generated tsvector column with a GIN index on PostgreSQL.
+
+# SQLite migrations that alter campaign_campaign rebuild the table and drop its
+# triggers, so they are recreated after every migrate.
+SQLITE_TRIGGERS = {
+    "campaign_campaign_fts_insert": """
+        CREATE TRIGGER campaign_campaign_fts_insert AFTER INSERT ON campaign_campaign BEGIN
+            INSERT INTO campaign_campaign_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END""",
+    "campaign_campaign_fts_delete": """
+        CREATE TRIGGER campaign_campaign_fts_delete AFTER DELETE ON campaign_campaign BEGIN
+            INSERT INTO campaign_campaign_fts(campaign_campaign_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END""",
+    "campaign_campaign_fts_update": """
+        CREATE TRIGGER campaign_campaign_fts_update AFTER UPDATE OF title, description ON campaign_campaign BEGIN
+            INSERT INTO campaign_campaign_fts(campaign_campaign_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO campaign_campaign_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END""",
+}
+
+SQLITE_MATCH = (
+    "campaign_campaign.id IN (SELECT rowid FROM campaign_campaign_fts "
+    "WHERE campaign_campaign_fts MATCH %s)")
+SQLITE_RANK = (
+    "SELECT -bm25(campaign_campaign_fts, 2.0, 1.0) FROM campaign_campaign_fts "
+    "WHERE campaign_campaign_fts MATCH %s AND rowid = campaign_campaign.id")
+
+POSTGRESQL_MATCH = "campaign_campaign.search_vector @@ websearch_to_tsquery('simple', %s)"
+POSTGRESQL_RANK = "ts_rank(campaign_campaign.search_vector, websearch_to_tsquery('simple', %s))"
+
+
+def fts5_query(q):
+    """
+    Quote every word of q so user input can't break the FTS5 query syntax,
+    the last word also matches as a prefix.
+    """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def search_campaigns(queryset, q):
+    """
+    Filter queryset to the campaigns matching q, annotated with a `rank`
+    where a higher value is more relevant.
+    """
+    if connection.vendor == "sqlite":
+        query = fts5_query(q)
+        if query is None:
+            return queryset.none()
+        return queryset.filter(RawSQL(SQLITE_MATCH, [query], output_field=BooleanField())).annotate(
+            rank=RawSQL(SQLITE_RANK, [query], output_field=FloatField()))
+
+    if connection.vendor == "postgresql":
+        return queryset.filter(RawSQL(POSTGRESQL_MATCH, [q], output_field=BooleanField())).annotate(
+            rank=RawSQL(POSTGRESQL_RANK, [q], output_field=FloatField()))
+
+    return queryset.filter(Q(title__icontains=q) | Q(description__icontains=q)).annotate(
+        rank=Value(0.0, output_field=FloatField()))
+
+
+def ensure_sqlite_search_triggers(using):
+    """
+    Recreate missing FTS5 sync triggers and rebuild the index they missed.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE 'campaign_campaign_fts%'")
+        names = {row[0] for row in cursor.fetchall()}
+        if "campaign_campaign_fts" not in names:
+            return
+        missing = [name for name in SQLITE_TRIGGERS if name not in names]
+        for name in missing:
+            cursor.execute(SQLITE_TRIGGERS[name])
+        if missing:
+            cursor.execute(
+                "INSERT INTO campaign_campaign_fts(campaign_campaign_fts) VALUES ('rebuild')")
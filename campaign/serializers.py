@@ -1,16 +1,19 @@
+from app.serializers import DATETIME, RowSerializer, full_name
 from rest_framework import serializers
 from wallet.models import DonationHistory, WithdrawRequest
 
 from campaign.models import Campaign
 
+
 class CampaignListSerializer(serializers.ModelSerializer):
     fundraiser = serializers.SerializerMethodField(
         required=False, read_only=True)
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = Campaign
         fields = ('id', 'title', 'description', 'amount', 'target_amount',
-                  'created_at', 'status', 'fundraiser', 'image_url')
+                  'created_at', 'status', 'fundraiser', 'image_url', 'stats')
 
     def get_fundraiser(self, obj):
         fundraiser = getattr(obj, "fundraiser", None)
@@ -18,17 +21,81 @@ class CampaignListSerializer(serializers.ModelSerializer):
             return
         return {"full_name": fundraiser.get_full_name(), "email": fundraiser.email}
 
+    def get_stats(self, obj):
+        stats = getattr(obj, "stats", None)
+        if not stats:
+            return {"donor_count": 0, "average_donation": 0, "last_donation_at": None}
+        return {"donor_count": stats.donor_count, "average_donation": stats.average_donation,
+                "last_donation_at": serializers.DateTimeField().to_representation(stats.last_donation_at)}
+
+
+class CampaignListRowSerializer(RowSerializer):
+    """
+    CampaignListSerializer for .values() rows.
+    """
+    columns = ('id', 'title', 'description', 'amount', 'target_amount', 'created_at', 'status',
+               'image_url', 'fundraiser__first_name', 'fundraiser__last_name', 'fundraiser__email',
+               'stats__donor_count', 'stats__donation_count', 'stats__donation_total',
+               'stats__last_donation_at')
+
+    def to_representation(self, row):
+        donation_count = row['stats__donation_count']
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'amount': row['amount'],
+            'target_amount': row['target_amount'],
+            'created_at': DATETIME.to_representation(row['created_at']),
+            'status': row['status'],
+            'fundraiser': {'full_name': full_name(row['fundraiser__first_name'], row['fundraiser__last_name']),
+                           'email': row['fundraiser__email']},
+            'image_url': row['image_url'],
+            'stats': {'donor_count': row['stats__donor_count'] or 0,
+                      'average_donation': row['stats__donation_total'] // donation_count if donation_count else 0,
+                      'last_donation_at': DATETIME.to_representation(row['stats__last_donation_at'])},
+        }
+
+
+class CampaignFeedQuerySerializer(serializers.Serializer):
+    ORDERINGS = {
+        "-created_at": ('-created_at', '-id'),
+        "created_at": ('created_at', 'id'),
+        "-progress": ('-progress', '-id'),
+        "progress": ('progress', 'id'),
+        "remaining": ('remaining_amount', 'id'),
+        "-remaining": ('-remaining_amount', '-id'),
+    }
+
+    q = serializers.CharField(required=False, allow_blank=True, trim_whitespace=True)
+    fundraiser = serializers.IntegerField(required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    target_min = serializers.IntegerField(required=False, min_value=0)
+    target_max = serializers.IntegerField(required=False, min_value=0)
+    ordering = serializers.ChoiceField(choices=list(ORDERINGS), required=False)
+
 
 class DonationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
-        style={'input_type': 'password'}, min_length=8, required=True)
+        style={'input_type': 'password'}, min_length=8, required=False)
+    donation_token = serializers.CharField(required=False, write_only=True)
     amount = serializers.IntegerField(min_value=5000, required=True)
 
     class Meta:
         model = DonationHistory
-        fields = ('id', 'user', 'date', 'amount', 'password', 'campaign')
+        fields = ('id', 'user', 'date', 'amount', 'password', 'donation_token', 'campaign')
         read_only_fields = ('id', 'user', 'date', 'campaign')
 
+    def validate(self, attrs):
+        if not attrs.get('password') and not attrs.get('donation_token'):
+            raise serializers.ValidationError({'password': ["Either password or donation_token is required."]})
+        return attrs
+
+
+class DonationTokenSerializer(serializers.Serializer):
+    password = serializers.CharField(style={'input_type': 'password'}, write_only=True)
+
 
 class DonationViewSerializer(serializers.ModelSerializer):
     campaign = serializers.CharField(
@@ -39,6 +106,14 @@ class DonationViewSerializer(serializers.ModelSerializer):
         fields = ('date', 'campaign', 'amount')
 
 
+class DonationViewRowSerializer(RowSerializer):
+    columns = ('date', 'campaign__title', 'amount')
+
+    def to_representation(self, row):
+        return {'date': DATETIME.to_representation(row['date']), 'campaign': row['campaign__title'],
+                'amount': row['amount']}
+
+
 class CampaignListFundraiserSerializer(serializers.ModelSerializer):
     fundraiser = serializers.SerializerMethodField(
         required=False, read_only=True)
@@ -89,6 +164,14 @@ class WithdrawRequestSerializer(serializers.ModelSerializer):
         fields = ('campaign', 'request_date', 'amount', 'status')
 
 
+class WithdrawRequestRowSerializer(RowSerializer):
+    columns = ('campaign__title', 'request_date', 'amount', 'status')
+
+    def to_representation(self, row):
+        return {'campaign': row['campaign__title'], 'request_date': DATETIME.to_representation(row['request_date']),
+                'amount': row['amount'], 'status': row['status']}
+
+
 class WithdrawVerifySerializer(serializers.ModelSerializer):
     user = serializers.CharField(source="user.get_full_name", read_only=True)
     user_email = serializers.EmailField(source="user.email", read_only=True)
@@ -98,6 +181,23 @@ class WithdrawVerifySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class WithdrawVerifyRowSerializer(RowSerializer):
+    columns = ('id', 'user__first_name', 'user__last_name', 'user__email', 'request_date', 'verified_date',
+               'amount', 'status', 'campaign_id')
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'user': full_name(row['user__first_name'], row['user__last_name']),
+            'user_email': row['user__email'],
+            'request_date': DATETIME.to_representation(row['request_date']),
+            'verified_date': DATETIME.to_representation(row['verified_date']),
+            'amount': row['amount'],
+            'status': row['status'],
+            'campaign': row['campaign_id'],
+        }
+
+
 class CampaignListProposalSerializer(serializers.ModelSerializer):
     fundraiser = serializers.SerializerMethodField()
 
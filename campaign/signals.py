@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from users.models import User
+from wallet.models import TopUpHistory, WithdrawRequest
+
+from .cache import invalidate_notification_counts
+from .models import Campaign, FeedVersion
+from .search import ensure_sqlite_search_triggers
+
+
+@receiver(post_save, sender=TopUpHistory)
+@receiver(post_delete, sender=TopUpHistory)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Campaign)
+@receiver(post_delete, sender=Campaign)
+@receiver(post_save, sender=WithdrawRequest)
+@receiver(post_delete, sender=WithdrawRequest)
+def notification_count_changed(sender, **kwargs):
+    invalidate_notification_counts()
+
+
+@receiver(post_save, sender=Campaign)
+@receiver(post_delete, sender=Campaign)
+def feed_changed(sender, **kwargs):
+    FeedVersion.bump_on_commit()
+
+
+@receiver(post_save, sender=User)
+def fundraiser_changed(sender, instance, update_fields=None, **kwargs):
+    # The feed shows the name and email of fundraisers.
+    if instance.role == "FUNDRAISER" and (
+            update_fields is None or {"first_name", "last_name", "email"} & set(update_fields)):
+        FeedVersion.bump_on_commit()
+
+
+def search_index_migrated(sender, using, **kwargs):
+    ensure_sqlite_search_triggers(using)
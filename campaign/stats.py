@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+EMPTY_STATS = {"donor_count": 0, "donation_count": 0,
+               "donation_total": 0, "last_donation_at": None}
+
+
+def expected_stats(DonationHistory):
+    """
+    {campaign id: stats} computed from the donations of each campaign.
+    """
+    rows = (DonationHistory.objects.order_by()
+            .values("campaign_id")
+            .annotate(donor_count=Count("user", distinct=True),
+                      donation_count=Count("id"),
+                      donation_total=Sum("amount"),
+                      last_donation_at=Max("date")))
+    return {row.pop("campaign_id"): row for row in rows}
+
+
+def rebuild_stats(Campaign, CampaignStats, DonationHistory):
+    """
+    Replace every CampaignStats row with stats computed from DonationHistory.
+    The campaign rows are locked first: donate() updates its campaign before
+    writing the donation, so donations in flight commit before the stats are
+    read and new ones wait until the rebuilt rows are in place.
+    Takes the models as arguments so migrations can pass their historical ones.
+    Returns the number of campaigns with donations.
+    """
+    with transaction.atomic():
+        list(Campaign.objects.select_for_update().order_by("pk").values_list("pk", flat=True))
+        expected = expected_stats(DonationHistory)
+        CampaignStats.objects.all().delete()
+        CampaignStats.objects.bulk_create(
+            CampaignStats(campaign_id=campaign_id, **stats) for campaign_id, stats in expected.items())
+    return len(expected)
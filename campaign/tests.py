@@ -1,12 +1,34 @@
+import functools
+import json
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient, APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 from users.models import User
-from wallet.models import DonationHistory, WithdrawRequest
+from wallet.models import DonationHistory, TopUpHistory, WithdrawRequest
 
-from campaign.models import Campaign
+from campaign.models import Campaign, CampaignStats, FeedVersion
+from campaign.serializers import (CampaignListRowSerializer,
+                                  CampaignListSerializer,
+                                  DonationViewRowSerializer,
+                                  DonationViewSerializer,
+                                  WithdrawRequestRowSerializer,
+                                  WithdrawRequestSerializer,
+                                  WithdrawVerifyRowSerializer,
+                                  WithdrawVerifySerializer)
+from campaign.tokens import DonationToken
 
 
 class CampaignFundraiserViewTests(APITestCase):
@@ -14,6 +36,8 @@ class CampaignFundraiserViewTests(APITestCase):
 
     def setUp(self) -> None:
         self.client = APIClient()
+        # Feed pages are keyed by FeedVersion, which rolls back with each test.
+        cache.clear()
 
     @classmethod
     def setUpTestData(cls) -> None:
@@ -71,9 +95,219 @@ class CampaignFundraiserViewTests(APITestCase):
         data = response.json()
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(data), 1)
+        self.assertEqual(len(data["results"]), 1)
         self.assertEqual(Campaign.objects.all().count(), 2)
 
+    def test_get_all_campaigns_paginated(self):
+        campaigns = [self.fundraiser_create_campaign for _ in range(5)]
+        Campaign.objects.update(status="VERIFIED")
+
+        url = "http://127.0.0.1:8000/api/campaigns/?page_size=2"
+        ids = []
+        while url:
+            response = self.client.get(url, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            self.assertLessEqual(len(data["results"]), 2)
+            ids += [campaign["id"] for campaign in data["results"]]
+            url = data["next"]
+
+        self.assertEqual(ids, [campaign.id for campaign in reversed(campaigns)])
+
+    def test_search_campaigns(self):
+        def create(title, description, status="VERIFIED"):
+            return Campaign.objects.create(title=title, description=description, target_amount=10000,
+                                           status=status, fundraiser=self.user)
+
+        in_description = create("Help the village", "Rebuild the flood damaged school")
+        in_title = create("School supplies", "Books and uniforms for children")
+        create("Medical aid", "Hospital bills")
+        create("School for everyone", "Pending campaign", status="PENDING")
+        renamed = create("Old title", "Nothing to see")
+
+        url = "http://127.0.0.1:8000/api/campaigns/"
+        response = self.client.get(url, {"q": "school"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([campaign["id"] for campaign in response.json()["results"]],
+                         [in_title.id, in_description.id])
+
+        response = self.client.get(url, {"q": "school", "page_size": 1}, format="json")
+        self.assertEqual(response.json()["results"][0]["id"], in_title.id)
+        response = self.client.get(response.json()["next"], format="json")
+        self.assertEqual(response.json()["results"][0]["id"], in_description.id)
+        self.assertIsNone(response.json()["next"])
+
+        renamed.title = "Schoolbus repair"
+        renamed.save()
+        in_title.delete()
+        response = self.client.get(url, {"q": "schoo"}, format="json")
+        self.assertEqual({campaign["id"] for campaign in response.json()["results"]},
+                         {renamed.id, in_description.id})
+
+        response = self.client.get(url, {"q": '"AND ('}, format="json")
+        self.assertEqual(response.json()["results"], [])
+
+    def test_filter_and_sort_campaigns(self):
+        def create(target_amount, amount):
+            campaign = Campaign.objects.create(title="Title", description="Description", status="VERIFIED",
+                                               target_amount=target_amount, fundraiser=self.user)
+            donor = User.objects.create_user(
+                first_name="Do", last_name="nor", email=f"donor{campaign.id}@user.com",
+                password="user1234", role="DONATUR", wallet_amount=amount)
+            if amount:
+                campaign.donate(donor, amount)
+            return campaign
+
+        half = create(100000, 50000)
+        almost = create(100000, 90000)
+        fresh = create(200000, 0)
+        other = Campaign.objects.create(
+            title="Other", description="Other", status="VERIFIED", target_amount=10, fundraiser=User.objects.create_user(
+                first_name="Ot", last_name="her", email="other@user.com", password="user1234",
+                role="FUNDRAISER", proposal_text="CAMPAIGN"))
+
+        url = "http://127.0.0.1:8000/api/campaigns/"
+
+        def ids(**params):
+            response = self.client.get(url, params, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [campaign["id"] for campaign in response.json()["results"]]
+
+        self.assertEqual(Campaign.objects.get(pk=almost.pk).progress, 0.9)
+        self.assertEqual(ids(ordering="-progress", fundraiser=self.user.id), [almost.id, half.id, fresh.id])
+        self.assertEqual(ids(ordering="remaining", fundraiser=self.user.id), [almost.id, half.id, fresh.id])
+        self.assertEqual(ids(target_min=100000, target_max=150000), [almost.id, half.id])
+        self.assertEqual(ids(fundraiser=other.fundraiser_id), [other.id])
+        self.assertEqual(ids(created_after=timezone.now().isoformat()), [])
+
+        response = self.client.get(url, {"ordering": "amount"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_campaigns_conditional_get(self):
+        campaign = self.fundraiser_create_campaign
+        campaign.verify()
+        url = "http://127.0.0.1:8000/api/campaigns/"
+
+        response = self.client.get(url, format="json")
+        etag = response["ETag"]
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("Accept", response["Vary"])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn("public", response["Cache-Control"])
+
+        response = self.client.get(
+            url, {"page_size": 1}, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertFalse(response.has_header("Last-Modified"))
+        response = self.client.get(url, format="json", HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign.stop()
+        response = self.client.get(url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_campaigns_etag_per_media_type(self):
+        self.fundraiser_create_campaign.verify()
+        url = "http://127.0.0.1:8000/api/campaigns/"
+
+        etag = self.client.get(url, HTTP_ACCEPT="application/msgpack")["ETag"]
+        response = self.client.get(url, HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_campaigns_response_cache(self):
+        admin = User.objects.create_superuser(
+            email="admin@admin.com", password="admin3231", first_name="Te", last_name="st")
+        campaign = self.fundraiser_create_campaign
+        campaign.verify()
+        url = "http://127.0.0.1:8000/api/campaigns/"
+
+        self.client.get(url, format="json")
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format="json")
+        self.assertEqual(response.json()["results"][0]["id"], campaign.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign.stop()
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.json()["results"], [])
+
+        response = self.client.get("http://127.0.0.1:8000/api/admin/feed-cache/", format="json",
+                                   HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+        self.assertEqual(response.json(), {"hits": 1, "misses": 2, "hit_ratio": 1 / 3})
+
+    def test_campaigns_cache_builds_links_per_request(self):
+        for _ in range(3):
+            self.fundraiser_create_campaign.verify()
+        url = "/api/campaigns/?page_size=1"
+
+        evil = self.client.get(url, HTTP_HOST="evil.example").json()
+        self.assertTrue(evil["next"].startswith("http://evil.example/api/campaigns/?"))
+        with self.assertNumQueries(1):
+            page = self.client.get(url, HTTP_HOST="api.donatur.app", secure=True).json()
+        self.assertEqual(page["results"], evil["results"])
+        self.assertTrue(page["next"].startswith("https://api.donatur.app/api/campaigns/?"))
+        self.assertIsNone(page["previous"])
+
+        second = self.client.get(page["next"], HTTP_HOST="api.donatur.app", secure=True).json()
+        self.assertTrue(second["previous"].startswith("https://api.donatur.app/"))
+        cached = self.client.get(page["next"], HTTP_HOST="testserver").json()
+        self.assertEqual(cached["results"], second["results"])
+        self.assertTrue(cached["previous"].startswith("http://testserver/"))
+        self.assertEqual(self.client.get(cached["previous"]).json()["results"], page["results"])
+
+    def test_campaigns_cache_follows_commits(self):
+        campaign = self.fundraiser_create_campaign
+        campaign.verify()
+        donor = User.objects.create_user(
+            first_name="Do", last_name="nor", email="donor@user.com",
+            password="user1234", role="DONATUR", wallet_amount=10000)
+        url = "http://127.0.0.1:8000/api/campaigns/"
+
+        def first():
+            return self.client.get(url, format="json").json()["results"][0]
+
+        updated_at = Campaign.objects.get(pk=campaign.pk).updated_at
+        first()
+        # A donation stamped before the newest updated_at, as one committing
+        # late would be, still changes the cached page.
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign.donate(donor, 10000)
+        Campaign.objects.filter(pk=campaign.pk).update(updated_at=updated_at)
+        self.assertEqual(first()["amount"], 10000)
+
+        self.user.first_name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertTrue(first()["fundraiser"]["full_name"].startswith("Renamed"))
+
+        CampaignStats.objects.update(donor_count=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("rebuild_campaign_stats", stdout=StringIO())
+        self.assertEqual(first()["stats"]["donor_count"], 1)
+
+    def test_feed_version_bumped_after_commit(self):
+        campaign = self.fundraiser_create_campaign
+        donor = User.objects.create_user(
+            first_name="Do", last_name="nor", email="donor@user.com",
+            password="user1234", role="DONATUR", wallet_amount=10000)
+        version = FeedVersion.current()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            campaign.donate(donor, 10000)
+            self.assertEqual(FeedVersion.current(), version)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(FeedVersion.current(), version + 1)
+
     def test_fundraiser_get_all_campaigns(self):
         url = f"{self.BASE_URL}/"
         response = self.client.get(url, format="json", **self.bearer_token)
@@ -161,6 +395,219 @@ class CampaignFundraiserViewTests(APITestCase):
             id=campaign.id).status, "STOPPED")
 
 
+class QueryCountMixin:
+    """
+    Assertions for list endpoints that must run a constant number of queries
+    whatever the row count.
+    """
+
+    def bearer_token(self, user):
+        return {"HTTP_AUTHORIZATION": f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    def count_queries(self, url, **extra):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, format="json", **extra)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url, make_rows, **extra):
+        """
+        Same query count for url after make_rows(1) as after make_rows(5) more.
+        """
+        make_rows(1)
+        expected = self.count_queries(url, **extra)
+        make_rows(5)
+        self.assertEqual(self.count_queries(url, **extra), expected)
+
+
+class CampaignQueryCountTests(QueryCountMixin, APITestCase):
+    """List endpoints must run a constant number of queries whatever the row count."""
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create_superuser(
+            email="admin@admin.com", password="admin3231", first_name="Te",
+            last_name="st")
+        cls.fundraiser = User.objects.create_user(
+            first_name="Te", last_name="st", email="user@user.com",
+            password="user1234", role="FUNDRAISER", proposal_text="CAMPAIGN", verified=True)
+
+    def make_campaigns(self, count, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(count):
+                i = User.objects.count()
+                fundraiser = User.objects.create_user(
+                    first_name="Fund", last_name=str(i), email=f"fund{i}@user.com",
+                    password="user1234", role="FUNDRAISER", proposal_text="CAMPAIGN")
+                Campaign.objects.create(
+                    title="Title", description="Description", target_amount=10000,
+                    status=status, fundraiser=fundraiser)
+
+    def test_campaign_list(self):
+        self.assertConstantQueries(
+            "http://127.0.0.1:8000/api/campaigns/", functools.partial(self.make_campaigns, status="VERIFIED"))
+
+    def test_campaign_proposal_list(self):
+        self.assertConstantQueries(
+            "http://127.0.0.1:8000/api/admin/proposals/", functools.partial(self.make_campaigns, status="PENDING"),
+            **self.bearer_token(self.admin))
+
+    def test_fundraiser_campaign_list(self):
+        def make_campaigns(count):
+            for _ in range(count):
+                Campaign.objects.create(
+                    title="Title", description="Description", target_amount=10000, fundraiser=self.fundraiser)
+
+        self.assertConstantQueries(
+            "http://127.0.0.1:8000/api/fundraiser/campaigns/", make_campaigns, **self.bearer_token(self.fundraiser))
+
+
+class HistoryPaginationTests(QueryCountMixin, APITestCase):
+    """Wallet histories are keyset paginated with a constant number of queries."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create_superuser(
+            email="admin@admin.com", password="admin3231", first_name="Te", last_name="st")
+        cls.donor = User.objects.create_user(
+            first_name="Do", last_name="nor", email="donor@user.com", password="user1234",
+            role="DONATUR", wallet_amount=10 ** 6)
+        cls.fundraiser = User.objects.create_user(
+            first_name="Fund", last_name="raiser", email="fund@user.com", password="user1234",
+            role="FUNDRAISER", proposal_text="CAMPAIGN", verified=True)
+
+    def make_history(self, count):
+        for _ in range(count):
+            campaign = Campaign.objects.create(
+                title=f"Campaign {Campaign.objects.count()}", description="Description",
+                target_amount=10 ** 6, status="VERIFIED", fundraiser=self.fundraiser)
+            campaign.donate(self.donor, 5000)
+            WithdrawRequest.objects.create(user=self.fundraiser, campaign=campaign, amount=1000)
+
+    def test_donation_queries(self):
+        self.assertConstantQueries(
+            "http://127.0.0.1:8000/api/donate/", self.make_history, **self.bearer_token(self.donor))
+
+    def test_withdraw_queries(self):
+        self.assertConstantQueries(
+            "http://127.0.0.1:8000/api/withdraw/", self.make_history, **self.bearer_token(self.fundraiser))
+
+    def test_withdraw_verify_queries(self):
+        self.assertConstantQueries(
+            "http://127.0.0.1:8000/api/withdraw/requests/", self.make_history, **self.bearer_token(self.admin))
+
+    def test_pages_follow_date_order(self):
+        self.make_history(7)
+        url, titles = "http://127.0.0.1:8000/api/donate/?page_size=3", []
+        while url:
+            data = self.client.get(url, **self.bearer_token(self.donor)).json()
+            self.assertLessEqual(len(data["results"]), 3)
+            titles += [donation["campaign"] for donation in data["results"]]
+            url = data["next"]
+        self.assertEqual(titles, [f"Campaign {i}" for i in reversed(range(7))])
+
+    def test_withdraw_verify_row_serializer(self):
+        self.make_history(2)
+        WithdrawRequest.objects.filter(pk=WithdrawRequest.objects.first().pk).update(verified_date=timezone.now())
+        queryset = WithdrawRequest.objects.all()
+        rows = WithdrawVerifyRowSerializer(WithdrawVerifyRowSerializer.rows(queryset), many=True).data
+        self.assertEqual(JSONRenderer().render(rows),
+                         JSONRenderer().render(WithdrawVerifySerializer(queryset, many=True).data))
+
+
+class RowSerializerTests(APITestCase):
+    """Row serializers must render exactly what their ModelSerializer does."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.fundraiser = User.objects.create_user(
+            first_name="Té", last_name="st", email="fund@user.com", password="user1234",
+            role="FUNDRAISER", proposal_text="CAMPAIGN", verified=True)
+        cls.donor = User.objects.create_user(
+            first_name="Do", last_name="nor", email="donor@user.com", password="user1234",
+            role="DONATUR", wallet_amount=100000)
+        cls.campaign = Campaign.objects.create(
+            title="Bantu – sesama", description="Description", target_amount=30000,
+            status="VERIFIED", fundraiser=cls.fundraiser, image_url="https://example.com/a.png")
+        Campaign.objects.create(title="No target", description="Description",
+                                status="VERIFIED", fundraiser=cls.fundraiser)
+        cls.campaign.donate(cls.donor, 10000)
+        cls.campaign.donate(cls.donor, 5001)
+        WithdrawRequest.objects.create(user=cls.fundraiser, campaign=cls.campaign, amount=5000)
+
+    def assertSameOutput(self, serializer_class, row_serializer_class, queryset):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        rows = row_serializer_class.rows(queryset)
+        self.assertEqual(JSONRenderer().render(row_serializer_class(rows, many=True).data), expected)
+        self.assertEqual(row_serializer_class(rows[0]).data, serializer_class(queryset[0]).data)
+
+    def test_campaign_list(self):
+        self.assertSameOutput(CampaignListSerializer, CampaignListRowSerializer, Campaign.objects.all())
+
+    def test_donation_view(self):
+        self.assertSameOutput(DonationViewSerializer, DonationViewRowSerializer, DonationHistory.objects.all())
+
+    def test_withdraw_request(self):
+        self.assertSameOutput(WithdrawRequestSerializer, WithdrawRequestRowSerializer, WithdrawRequest.objects.all())
+
+    def test_campaign_feed_endpoint(self):
+        response = self.client.get("http://127.0.0.1:8000/api/campaigns/?ordering=-progress")
+        expected = CampaignListSerializer(Campaign.objects.order_by("-progress", "-id"), many=True).data
+        self.assertEqual(response.json()["results"], json.loads(JSONRenderer().render(expected)))
+
+
+class QueryPlanTests(APITestCase):
+    """The hot list querysets must be served by their indexes, not full scans."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(
+            first_name="Te", last_name="st",
+            email="user@user.com", password="user1234", role="DONATUR")
+
+    def assertUsesIndex(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # Tiny test tables are cheaper to scan; make the planner show
+                # whether the index is usable at all.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        if connection.vendor == "sqlite":
+            self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan)
+
+    def test_verified_campaigns(self):
+        self.assertUsesIndex(Campaign.objects.filter(
+            status="VERIFIED"), "campaign_status_created_idx")
+
+    def test_verified_campaigns_by_progress(self):
+        self.assertUsesIndex(Campaign.objects.filter(status="VERIFIED").order_by(
+            "-progress", "-id"), "campaign_status_progress_idx")
+
+    def test_verified_campaigns_by_remaining(self):
+        self.assertUsesIndex(Campaign.objects.filter(status="VERIFIED").order_by(
+            "remaining_amount", "id"), "campaign_status_remaining_idx")
+
+    def test_pending_top_ups(self):
+        self.assertUsesIndex(TopUpHistory.objects.filter(
+            status="PENDING"), "topup_pending_date_idx")
+
+    def test_pending_withdraws(self):
+        self.assertUsesIndex(WithdrawRequest.objects.filter(
+            status="PENDING"), "withdraw_pending_date_idx")
+
+    def test_user_donations(self):
+        self.assertUsesIndex(DonationHistory.objects.filter(
+            user=self.user), "donation_user_date_idx")
+
+    def test_pending_fundraisers(self):
+        self.assertUsesIndex(User.objects.filter(
+            role="FUNDRAISER", verified=False), "user_fundraiser_pending_idx")
+
+
 class CampaignVerifyViewTests(APITestCase):
     BASE_URL = "http://127.0.0.1:8000/api/admin/proposals"
 
@@ -374,6 +821,19 @@ class DonationViewTests(APITestCase):
         user = User.objects.get(email="user@user.com")
         self.assertEqual(user.wallet_amount, 100000 - 6000)
 
+    def test_status_change_keeps_concurrent_donation(self):
+        campaign = self.make_campaign
+        campaign.verify()
+        stale = Campaign.objects.get(pk=campaign.pk)
+        campaign.donate(self.user, 6000)
+        stale.stop()
+
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, "STOPPED")
+        self.assertEqual(campaign.amount, 6000)
+        self.assertEqual(campaign.progress, 0.6)
+        self.assertEqual(campaign.remaining_amount, 4000)
+
     def test_create_donation_wrong_password(self):
         campaign = self.make_campaign
         url = f"{self.BASE_URL}/{campaign.id}/"
@@ -396,6 +856,164 @@ class DonationViewTests(APITestCase):
             url, request, format="json", **self.bearer_token2)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def donation_token(self):
+        response = self.client.post("http://127.0.0.1:8000/api/donor/donation-token/",
+                                    {"password": "user1234"}, format="json", **self.bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.json()["donation_token"]
+
+    def test_donate_with_donation_token(self):
+        campaign = self.make_campaign
+        token = self.donation_token()
+        url = f"{self.BASE_URL}/{campaign.id}/"
+        for _ in range(2):
+            response = self.client.post(
+                url, {"amount": 6000, "donation_token": token}, format="json", **self.bearer_token)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(User.objects.get(pk=self.user.pk).wallet_amount, 88000)
+
+    def test_donation_token_claims(self):
+        token = DonationToken(self.donation_token())
+        self.assertNotIn("password", token.payload)
+        self.assertNotIn(self.user.get_session_auth_hash(), token.payload.values())
+
+    def test_donation_token_rejections(self):
+        campaign = self.make_campaign
+        url = f"{self.BASE_URL}/{campaign.id}/"
+        response = self.client.post("http://127.0.0.1:8000/api/donor/donation-token/",
+                                    {"password": "wrong1234"}, format="json", **self.bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        token = self.donation_token()
+        # Neither a bearer token nor usable by another donor.
+        response = self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        User.objects.filter(pk=self.user2.pk).update(wallet_amount=100000)
+        response = self.client.post(
+            url, {"amount": 6000, "donation_token": token}, format="json", **self.bearer_token2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Changing the password revokes it.
+        self.user.set_password("changed1234")
+        self.user.save()
+        response = self.client.post(
+            url, {"amount": 6000, "donation_token": token}, format="json", **self.bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(url, {"amount": 6000}, format="json", **self.bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(DonationHistory.objects.count(), 0)
+
+    def test_donation_export(self):
+        campaign = self.make_campaign
+        campaign.donate(self.user, 6000)
+        campaign.donate(self.user, 7000)
+        response = self.client.get(
+            "http://127.0.0.1:8000/api/donate/export/?format=ndjson", **self.bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["amount"] for row in rows], [7000, 6000])
+        self.assertEqual(rows[0]["campaign"], "Title")
+        self.assertEqual(rows[0]["campaign_id"], campaign.id)
+
+        # Another donor only gets the header.
+        response = self.client.get("http://127.0.0.1:8000/api/donate/export/", **self.bearer_token2)
+        self.assertEqual(b"".join(response.streaming_content).decode().splitlines(),
+                         ["id,date,user_email,campaign_id,campaign,amount"])
+
+    def test_donate_concurrent_stale_wallet(self):
+        """Donations racing on stale user rows must not overdraw or lose updates."""
+        campaign = self.make_campaign
+        stale_users = [User.objects.get(pk=self.user.pk) for _ in range(25)]
+
+        donations = [campaign.donate(user, 6000) for user in stale_users]
+
+        succeeded = [donation for donation in donations if donation is not None]
+        self.assertEqual(len(succeeded), 100000 // 6000)
+        self.user.refresh_from_db()
+        campaign.refresh_from_db()
+        self.assertEqual(self.user.wallet_amount, 100000 - 6000 * len(succeeded))
+        self.assertEqual(campaign.amount, 6000 * len(succeeded))
+        self.assertEqual(DonationHistory.objects.filter(
+            campaign=campaign).count(), len(succeeded))
+
+    def test_retrieve_campaign_conditional_get(self):
+        campaign = self.make_campaign
+        url = f"{self.BASE_URL}/{campaign.id}/"
+
+        response = self.client.get(url, format="json", **self.bearer_token)
+        etag = response["ETag"]
+        self.assertIn("private", response["Cache-Control"])
+
+        response = self.client.get(
+            url, format="json", HTTP_IF_NONE_MATCH=etag, **self.bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        campaign.donate(self.user, 6000)
+        response = self.client.get(
+            url, format="json", HTTP_IF_NONE_MATCH=etag, **self.bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["amount"], 6000)
+        etag = response["ETag"]
+
+        def revalidate():
+            nonlocal etag
+            response = self.client.get(
+                url, format="json", HTTP_IF_NONE_MATCH=etag, **self.bearer_token)
+            etag = response["ETag"]
+            return response
+
+        self.assertEqual(revalidate().status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(revalidate().has_header("Last-Modified"))
+        User.objects.filter(pk=self.user.pk).update(first_name="Renamed")
+        response = revalidate()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["fundraiser"]["full_name"], "Renamed st")
+        CampaignStats.objects.filter(campaign=campaign).update(donor_count=5)
+        self.assertEqual(revalidate().status_code, status.HTTP_200_OK)
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack", HTTP_IF_NONE_MATCH=etag,
+                                   **self.bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_donation_updates_stats(self):
+        campaign = self.make_campaign
+        campaign.donate(self.user, 6000)
+        campaign.donate(self.user, 10000)
+
+        stats = CampaignStats.objects.get(campaign=campaign)
+        self.assertEqual(stats.donor_count, 1)
+        self.assertEqual(stats.donation_count, 2)
+        self.assertEqual(stats.average_donation, 8000)
+        self.assertEqual(stats.last_donation_at, DonationHistory.objects.filter(
+            campaign=campaign).latest("date").date)
+
+        response = self.client.get(
+            f"{self.BASE_URL}/{campaign.id}/", format="json", **self.bearer_token)
+        self.assertEqual(response.json()["stats"]["donor_count"], 1)
+        self.assertEqual(response.json()["stats"]["average_donation"], 8000)
+
+    def test_rebuild_campaign_stats(self):
+        campaign = self.make_campaign
+        campaign.donate(self.user, 6000)
+        CampaignStats.objects.filter(campaign=campaign).update(donor_count=5)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_campaign_stats", "--check", stdout=StringIO())
+
+        call_command("rebuild_campaign_stats", stdout=StringIO())
+        self.assertEqual(CampaignStats.objects.get(campaign=campaign).donor_count, 1)
+        call_command("rebuild_campaign_stats", "--check", stdout=StringIO())
+
+    def test_campaign_stats_backfill(self):
+        campaign = self.make_campaign
+        campaign.donate(self.user, 6000)
+        campaign.donate(self.user, 2000)
+        CampaignStats.objects.all().delete()
+
+        import_module("campaign.migrations.0008_campaignstats").backfill_stats(apps, None)
+        stats = CampaignStats.objects.get(campaign=campaign)
+        self.assertEqual((stats.donor_count, stats.donation_count, stats.average_donation), (1, 2, 4000))
+
     def test_donation_view(self):
         campaign = self.make_campaign
         url = f"{self.BASE_URL}/{campaign.id}/"
@@ -467,6 +1085,20 @@ class WithdrawVerifyViewTests(APITestCase):
         )
         return campaign
 
+    def test_withdraw_export(self):
+        campaign = self.make_campaign
+        WithdrawRequest.objects.create(user=self.fundraiser, campaign=campaign, amount=5000)
+        url = "http://127.0.0.1:8000/api/withdraw/export/"
+
+        response = self.client.get(url, **self.fundraiser_bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,request_date,verified_date,user_email,campaign_id,campaign,amount,status")
+        self.assertTrue(lines[1].endswith(",,fundraiser@gmail.com,%d,Title,5000,PENDING" % campaign.id))
+
+        response = self.client.get(url, **self.donatur_bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_withdraw_workflow(self):
         campaign = self.make_campaign
         campaign2 = self.make_campaign
@@ -515,7 +1147,7 @@ class WithdrawVerifyViewTests(APITestCase):
 
         response = self.client.get(
             self.WITHDRAW_LIST_URL, format="json", **self.fundraiser_bearer_token)
-        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(len(response.json()["results"]), 1)
 
         fundraiser = User.objects.get(email="fundraiser@gmail.com")
         withdraw = WithdrawRequest.objects.filter(user=fundraiser)
@@ -600,6 +1232,33 @@ class WithdrawVerifyViewTests(APITestCase):
         self.assertEqual(withdraw.status, "VERIFIED")
         self.assertEqual(fundraiser.wallet_amount, 300000)
 
+    def test_bulk_verify_withdraw(self):
+        campaign = self.make_campaign
+        Campaign.objects.filter(pk=campaign.pk).update(
+            amount=100000, withdraw_amount=60000)
+        withdraws = [WithdrawRequest.objects.create(
+            user=self.fundraiser, campaign=campaign, amount=amount) for amount in (10000, 20000, 30000)]
+
+        response = self.client.put(f"{self.VERIF_URL}/bulk/", {"requests": [
+            {"id": withdraws[0].id, "status": "VERIFIED"},
+            {"id": withdraws[1].id, "status": "REJECTED"},
+            {"id": withdraws[2].id, "status": "REJECTED"},
+        ]}, format="json", **self.admin_bearer_token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(all(result["success"]
+                        for result in response.json()["results"]))
+        self.assertEqual(Campaign.objects.get(
+            pk=campaign.pk).withdraw_amount, 10000)
+        self.assertEqual(User.objects.get(
+            pk=self.fundraiser.pk).wallet_amount, 10000)
+        self.assertFalse(WithdrawRequest.objects.filter(
+            verified_date__isnull=True).exists())
+
+        response = self.client.put(f"{self.VERIF_URL}/bulk/", {"requests": [
+            {"id": withdraws[0].id, "status": "REJECTED"}]}, format="json", **self.admin_bearer_token)
+        self.assertEqual(response.json()["results"][0]["code"], "verified")
+
     def test_fundraiser_not_verified(self):
         fundraiser = User.objects.get(email="fundraiser@gmail.com")
         fundraiser.verified = False
@@ -651,11 +1310,33 @@ class NotificationViewTests(APITestCase):
             email="admin@gmail.com", password="admin3231", first_name="I'm",
             last_name="Admin")
 
+    def setUp(self) -> None:
+        cache.clear()
+
     @property
     def admin_bearer_token(self):
         refresh = RefreshToken.for_user(self.admin)
         return {"HTTP_AUTHORIZATION": f'Bearer {refresh.access_token}'}
 
+    def test_notification_cached(self):
+        self.client.get(self.URL, format="json", **self.admin_bearer_token)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.URL, format="json", **self.admin_bearer_token)
+        # Only the JWT user lookup is left once the counts are cached.
+        self.assertEqual(len(context.captured_queries), 1)
+
+        fundraiser = User.objects.create_user(
+            first_name="I'm", last_name="Fundraiser",
+            email="fundraiser@gmail.com", password="user1234", role="FUNDRAISER", proposal_text="CAMPAIGN")
+        response = self.client.get(
+            self.URL, format="json", **self.admin_bearer_token)
+        self.assertEqual(response.json().get("fundraiser_request"), 1)
+
+        fundraiser.verify_fundraiser()
+        response = self.client.get(
+            self.URL, format="json", **self.admin_bearer_token)
+        self.assertEqual(response.json().get("fundraiser_request"), 0)
+
     def test_notification(self):
         fundraiser = User.objects.create_user(
             first_name="I'm", last_name="Fundraiser",
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+
+class DonationToken(Token):
+    """
+    Short-lived proof that the donor just confirmed their password, accepted
+    by the donate endpoint instead of the password. Checking it costs an HMAC
+    rather than a full password hash.
+
+    Its own token type keeps it from being used as an access token, and the
+    credential claim revokes it as soon as the password changes. The claim is
+    readable by the client, so it holds an HMAC made for this token only
+    rather than anything reused elsewhere, like the session auth hash.
+    """
+    token_type = "donation"
+    lifetime = settings.DONATION_TOKEN_LIFETIME
+
+    @staticmethod
+    def credential(user):
+        return salted_hmac("campaign.DonationToken", user.password, algorithm="sha256").hexdigest()
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["credential"] = cls.credential(user)
+        return token
+
+    @classmethod
+    def check(cls, raw_token, user):
+        """
+        Whether raw_token is an unexpired donation token issued to user since
+        their last password change.
+        """
+        try:
+            token = cls(raw_token)
+        except TokenError:
+            return False
+        return (token.get(api_settings.USER_ID_CLAIM) == getattr(user, api_settings.USER_ID_FIELD)
+                and constant_time_compare(token.get("credential", ""), cls.credential(user)))
@@ -1,27 +1,39 @@
+from app.async_views import view_for_server
 from django.urls import path
 
 from campaign.views import (CampaignList, CampaignListDonorById,
                             CampaignListFundraiser, CampaignListFundraiserById,
                             CampaignListProposal, CampaignListProposalById,
-                            DonationView, NotificationCountView,
-                            WithdrawRequestView, WithdrawVerifyView)
+                            DonationExportView, DonationTokenView,
+                            DonationView, FeedCacheStatsView,
+                            NotificationCountView, WithdrawBulkVerifyView,
+                            WithdrawExportView, WithdrawRequestView,
+                            WithdrawVerifyView)
 
 urlpatterns = [
-    path('campaigns/', CampaignList.as_view(), name='campaigns'),
+    path('campaigns/', view_for_server(CampaignList), name='campaigns'),
     path('donor/campaigns/<int:pk>/',
-         CampaignListDonorById.as_view(), name='campaign-donor-id'),
+         view_for_server(CampaignListDonorById), name='campaign-donor-id'),
+    path('donor/donation-token/', DonationTokenView.as_view(),
+         name='donation-token'),
     path('donate/', DonationView.as_view(), name='donation'),
+    path('donate/export/', DonationExportView.as_view(), name='donation-export'),
     path('fundraiser/campaigns/', CampaignListFundraiser.as_view(),
          name='campaign-fundraiser'),
     path('fundraiser/campaigns/<int:pk>/',
          CampaignListFundraiserById.as_view(), name='campaign-fundraiser-id'),
     path('withdraw/', WithdrawRequestView.as_view(), name='withdraw'),
+    path('withdraw/export/', WithdrawExportView.as_view(), name='withdraw-export'),
     path('withdraw/requests/', WithdrawVerifyView.as_view(),
          name='withdraw-requests'),
+    path('withdraw/requests/bulk/', WithdrawBulkVerifyView.as_view(),
+         name='withdraw-requests-bulk'),
     path('admin/proposals/', CampaignListProposal.as_view(),
          name='campaign-proposal'),
     path('admin/proposals/<int:pk>/', CampaignListProposalById.as_view(),
          name='campaign-proposal-id'),
-    path('admin/notification/', NotificationCountView.as_view(),
+    path('admin/notification/', view_for_server(NotificationCountView),
          name='admin-notification'),
+    path('admin/feed-cache/', FeedCacheStatsView.as_view(),
+         name='admin-feed-cache'),
 ]
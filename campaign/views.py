@@ -1,94 +1,255 @@
+import hashlib
+from collections import OrderedDict
+
+from app.serializers import RowListMixin
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from rest_framework import generics, permissions, status, views
 from rest_framework.response import Response
-from users.models import User
 from users.permissions import IsDonatur, isFundraiser
-from wallet.models import DonationHistory, TopUpHistory, WithdrawRequest
-
-from .models import Campaign
-from .serializers import (CampaignListFundraiserByIdSerializer,
+from wallet.idempotency import idempotent
+from wallet.models import DonationHistory, WithdrawRequest
+from wallet.pagination import HistoryCursorPagination
+from wallet.views import BulkVerifyView, HistoryExportView, verify_one
+
+from .cache import (get_feed_cache_stats, get_feed_page,
+                    get_notification_counts, set_feed_page)
+from .models import Campaign, FeedVersion
+from .pagination import CampaignCursorPagination
+from .search import search_campaigns
+from .serializers import (CampaignFeedQuerySerializer,
+                          CampaignListFundraiserByIdSerializer,
                           CampaignListFundraiserSerializer,
                           CampaignListProposalByIdSerializer,
                           CampaignListProposalSerializer,
+                          CampaignListRowSerializer,
                           CampaignListSerializer, DonationSerializer,
-                          DonationViewSerializer, WithdrawRequestSerializer,
-                          WithdrawSerializer, WithdrawVerifySerializer)
-
-
-class CampaignList(generics.ListAPIView):
+                          DonationTokenSerializer,
+                          DonationViewRowSerializer, DonationViewSerializer,
+                          WithdrawRequestRowSerializer,
+                          WithdrawRequestSerializer, WithdrawSerializer,
+                          WithdrawVerifyRowSerializer,
+                          WithdrawVerifySerializer)
+from .tokens import DonationToken
+
+
+def feed_version(request, *args, **kwargs):
+    if not hasattr(request, "_feed_version"):
+        request._feed_version = FeedVersion.current()
+    return request._feed_version
+
+
+def feed_cache_key(request):
+    key = f"{feed_version(request)}:{request.GET.urlencode()}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def feed_etag(request, *args, **kwargs):
+    # JSON, msgpack and the browsable API each get their own ETag.
+    key = f"{feed_cache_key(request)}:{request.accepted_media_type}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def campaign_etag(request, pk):
+    # Every column the detail body is built from, fundraiser and stats
+    # included, since editing those doesn't touch the campaign row.
+    state = Campaign.objects.filter(pk=pk).values_list(
+        "updated_at", "fundraiser__first_name", "fundraiser__last_name", "fundraiser__email",
+        "stats__donor_count", "stats__donation_count", "stats__donation_total",
+        "stats__last_donation_at").first()
+    if state is None:
+        return None
+    return hashlib.md5(f"{pk}:{state}:{request.accepted_media_type}".encode()).hexdigest()
+
+
+@method_decorator([
+    cache_control(public=True, max_age=settings.CAMPAIGN_FEED_MAX_AGE),
+    vary_on_headers("Accept"),
+    # No Last-Modified: removing a campaign from the feed doesn't move any
+    # date forward, so If-Modified-Since could validate a stale page.
+    condition(etag_func=feed_etag),
+], name="get")
+class CampaignList(RowListMixin, generics.ListAPIView):
     """
     Allowed Method: GET
-    GET     api/campaigns/ - List Verified Campaigns
+    GET     api/campaigns/ - List Verified Campaigns (cursor paginated)
+    GET     api/campaigns/?q=<text> - Search Verified Campaigns by relevance
+    Filters: fundraiser, created_after, created_before, target_min, target_max
+    Ordering: ?ordering=-created_at|created_at|-progress|progress|remaining|-remaining
     """
-    queryset = Campaign.objects.filter(status="VERIFIED")
+    queryset = Campaign.objects.with_fundraiser().with_stats().filter(status="VERIFIED")
     serializer_class = CampaignListSerializer
+    row_serializer_class = CampaignListRowSerializer
+    pagination_class = CampaignCursorPagination
+
+    def get_queryset(self):
+        query = CampaignFeedQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        queryset = super().get_queryset()
+        filters = {
+            "fundraiser": "fundraiser_id",
+            "created_after": "created_at__gte",
+            "created_before": "created_at__lt",
+            "target_min": "target_amount__gte",
+            "target_max": "target_amount__lte",
+        }
+        queryset = queryset.filter(**{lookup: params[name]
+                                      for name, lookup in filters.items() if name in params})
+
+        self.feed_ordering = CampaignFeedQuerySerializer.ORDERINGS["-created_at"]
+        if params.get("q"):
+            queryset = search_campaigns(queryset, params["q"])
+            self.feed_ordering = ('-rank', '-id')
+        if "ordering" in params:
+            self.feed_ordering = CampaignFeedQuerySerializer.ORDERINGS[params["ordering"]]
+        return queryset
+
+    def get_row_columns(self):
+        # The cursor is read from the first ordering field of the last row.
+        return (self.feed_ordering[0].lstrip('-'), )
+
+    def list(self, request, *args, **kwargs):
+        # Only the rows and cursors are cached: the links are absolute URLs
+        # built from the Host of the request, which the cache key ignores.
+        version_key = feed_cache_key(request)
+        page = get_feed_page(version_key)
+        if page is not None:
+            return Response(OrderedDict([
+                ("next", self.paginator.get_link(request, page["next"])),
+                ("previous", self.paginator.get_link(request, page["previous"])),
+                ("results", page["results"]),
+            ]))
+
+        response = super().list(request, *args, **kwargs)
+        set_feed_page(version_key, {
+            "next": self.paginator.get_cursor(response.data["next"]),
+            "previous": self.paginator.get_cursor(response.data["previous"]),
+            "results": response.data["results"],
+        })
+        return response
 
 
 class CampaignListDonorById(generics.RetrieveAPIView, generics.CreateAPIView):
     """
     Allowed Method: GET, POST
     GET     api/donor/campaigns/<int:id>/ - Retrieve Verified Campaign
-    POST    api/donor/campaigns/<int:id>/ - Donate a Campaign
+    POST    api/donor/campaigns/<int:id>/ - Donate a Campaign, confirmed by
+            the password or a token from api/donor/donation-token/
     """
     permission_classes = [
         IsDonatur,
         permissions.IsAuthenticated
     ]
-    queryset = Campaign.objects.filter(status="VERIFIED")
+    queryset = Campaign.objects.with_fundraiser().with_stats().filter(status="VERIFIED")
     serializer_class = CampaignListSerializer
 
+    @method_decorator([
+        cache_control(private=True, no_cache=True),
+        vary_on_headers("Accept", "Authorization"),
+        # ETag only, as for the feed: fundraiser edits move no date forward.
+        condition(etag_func=campaign_etag),
+    ])
     def get(self, request, pk):
         try:
-            campaign = Campaign.objects.get(pk=pk)
+            campaign = Campaign.objects.with_fundraiser().with_stats().get(pk=pk)
             serializer = self.get_serializer(campaign, many=False)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Campaign.DoesNotExist:
             return Response({"status": "campaign doesn't exist."}, status=status.HTTP_404_NOT_FOUND)
 
+    @idempotent
     def create(self, request, pk):
-        data = request.data
         user = request.user
         campaign = Campaign.objects.get(pk=pk)
-        serializer = DonationSerializer(data=data)
+        serializer = DonationSerializer(data=request.data)
 
-        is_valid = serializer.is_valid()
-        serializer_data = dict(serializer.data)
-        amount = serializer_data.get('amount', 0)
-        password = serializer_data.pop("password", "")
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        amount = serializer.validated_data["amount"]
+        password = serializer.validated_data.get("password")
+        donation_token = serializer.validated_data.get("donation_token")
 
         if not user.wallet_amount >= amount:
             return Response({"status": "Unable to process payment: Your wallet is low."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not user.check_password(password):
+        if donation_token:
+            if not DonationToken.check(donation_token, user):
+                return Response({"status": "Donation token is invalid or expired."}, status=status.HTTP_400_BAD_REQUEST)
+        elif not user.check_password(password):
             return Response({"status": "Password didn't match."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if is_valid:
-            DonationHistory.objects.create(
-                **serializer_data, user=user, campaign=campaign)
-            user.wallet_amount -= amount
-            user.save()
-            campaign.amount += amount
-            campaign.save()
-            return Response({"status": "Donation successfully transferred to campaign."}, status=status.HTTP_201_CREATED)
+        if campaign.donate(user, amount) is None:
+            return Response({"status": "Unable to process payment: Your wallet is low."}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"status": "Donation successfully transferred to campaign."}, status=status.HTTP_201_CREATED)
 
 
-class DonationView(generics.ListAPIView):
+class DonationTokenView(generics.GenericAPIView):
+    """
+    Allowed Method: POST
+    POST    api/donor/donation-token/ - Confirm the password once and get a
+            short-lived token to donate with instead of the password
+    """
+    permission_classes = [
+        IsDonatur,
+        permissions.IsAuthenticated
+    ]
+    serializer_class = DonationTokenSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if not request.user.check_password(serializer.validated_data["password"]):
+            return Response({"status": "Password didn't match."}, status=status.HTTP_400_BAD_REQUEST)
+
+        token = DonationToken.for_user(request.user)
+        return Response({"donation_token": str(token),
+                         "expires_in": int(DonationToken.lifetime.total_seconds())}, status=status.HTTP_201_CREATED)
+
+
+class DonationView(RowListMixin, generics.ListAPIView):
     """
     Allowed Method: GET
-    GET     api/donate/ - List of Donation History
+    GET     api/donate/ - List of Donation History (cursor paginated)
     """
     permission_classes = [
         IsDonatur,
         permissions.IsAuthenticated
     ]
     serializer_class = DonationViewSerializer
+    row_serializer_class = DonationViewRowSerializer
+    pagination_class = HistoryCursorPagination
 
     def get_queryset(self):
         return DonationHistory.objects.filter(user=self.request.user)
 
 
+class DonationExportView(HistoryExportView):
+    """
+    Allowed Method: GET
+    GET     api/donate/export/ - Donation History as CSV or NDJSON
+    """
+    permission_classes = [IsDonatur | permissions.IsAdminUser]
+    model = DonationHistory
+    filename = "donations"
+    columns = {
+        "id": "id",
+        "date": "date",
+        "user_email": "user__email",
+        "campaign_id": "campaign_id",
+        "campaign": "campaign__title",
+        "amount": "amount",
+    }
+
+
 class CampaignListFundraiser(generics.ListCreateAPIView):
     """
     Allowed Method: GET, POST
@@ -103,7 +264,7 @@ class CampaignListFundraiser(generics.ListCreateAPIView):
     serializer_class = CampaignListFundraiserSerializer
 
     def get(self, request):
-        campaigns = Campaign.objects.filter(fundraiser=request.user.id)
+        campaigns = Campaign.objects.with_fundraiser().filter(fundraiser=request.user.id)
         serializer = self.get_serializer(campaigns, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -140,12 +301,13 @@ class CampaignListFundraiserById(generics.RetrieveUpdateDestroyAPIView, generics
 
     def get(self, request, pk):
         try:
-            campaign = Campaign.objects.get(pk=pk, fundraiser=request.user)
+            campaign = Campaign.objects.with_fundraiser().get(pk=pk, fundraiser=request.user)
             serializer = self.get_serializer(campaign, many=False)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Campaign.DoesNotExist:
             return Response({"status": "campaign doesn't exist."}, status=status.HTTP_404_NOT_FOUND)
 
+    @idempotent
     def create(self, request, pk):
         if not request.user.verified:
             return Response({"status": "fundraiser not verified."}, status=status.HTTP_400_BAD_REQUEST)
@@ -162,10 +324,8 @@ class CampaignListFundraiserById(generics.RetrieveUpdateDestroyAPIView, generics
             return Response({"status": "You can't do withdraw request."}, status=status.HTTP_400_BAD_REQUEST)
 
         if is_valid:
-            WithdrawRequest.objects.create(
-                **serializer.data, user=user, campaign=campaign)
-            campaign.withdraw_amount += amount
-            campaign.save()
+            if campaign.request_withdraw(user, amount) is None:
+                return Response({"status": "You can't do withdraw request."}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response({"status": "failed withdraw"}, status=status.HTTP_400_BAD_REQUEST)
@@ -188,30 +348,54 @@ class CampaignListFundraiserById(generics.RetrieveUpdateDestroyAPIView, generics
             return Response({"status": "delete failed. Campaign doesn't exist."}, status=status.HTTP_404_NOT_FOUND)
 
 
-class WithdrawRequestView(generics.ListAPIView):
+class WithdrawRequestView(RowListMixin, generics.ListAPIView):
     """
     Allowed Method: GET
-    GET         api/withdraw/ - List of Withdraw Request
+    GET         api/withdraw/ - List of Withdraw Request (cursor paginated)
     """
     permission_classes = [
         isFundraiser,
         permissions.IsAuthenticated
     ]
     serializer_class = WithdrawRequestSerializer
+    row_serializer_class = WithdrawRequestRowSerializer
+    pagination_class = HistoryCursorPagination
 
     def get_queryset(self):
         return WithdrawRequest.objects.filter(user=self.request.user)
 
 
-class WithdrawVerifyView(generics.ListAPIView, generics.UpdateAPIView):
+class WithdrawExportView(HistoryExportView):
+    """
+    Allowed Method: GET
+    GET         api/withdraw/export/ - Withdraw Requests as CSV or NDJSON
+    """
+    permission_classes = [isFundraiser | permissions.IsAdminUser]
+    model = WithdrawRequest
+    filename = "withdraws"
+    columns = {
+        "id": "id",
+        "request_date": "request_date",
+        "verified_date": "verified_date",
+        "user_email": "user__email",
+        "campaign_id": "campaign_id",
+        "campaign": "campaign__title",
+        "amount": "amount",
+        "status": "status",
+    }
+
+
+class WithdrawVerifyView(RowListMixin, generics.ListAPIView, generics.UpdateAPIView):
     """
     Allowed Method: GET, PUT, PATCH
-    GET          api/withdraw/requests/ - List of Withdraw Request
+    GET          api/withdraw/requests/ - List of Withdraw Request (cursor paginated)
     PUT, PATCH   api/withdraw/requests/ - Verify Withdraw Request
     """
     permission_classes = [permissions.IsAdminUser]
     queryset = WithdrawRequest.objects.filter(status="PENDING")
     serializer_class = WithdrawVerifySerializer
+    row_serializer_class = WithdrawVerifyRowSerializer
+    pagination_class = HistoryCursorPagination
 
     def update(self, request, *args, **kwargs):
         data = request.data
@@ -229,20 +413,19 @@ class WithdrawVerifyView(generics.ListAPIView, generics.UpdateAPIView):
         if not withdraw_status or withdraw_status not in ("VERIFIED", "REJECTED"):
             return Response({"status": ["Invalid status"]}, status=status.HTTP_400_BAD_REQUEST)
 
-        withdraw = get_object_or_404(WithdrawRequest, id=withdraw_id)
+        error = verify_one(WithdrawRequest, int(withdraw_id), withdraw_status)
+        if error is not None:
+            return error
 
-        if withdraw.status == "VERIFIED":
-            return Response({"error": ["Already verified."], "code": "verified"}, status=status.HTTP_400_BAD_REQUEST)
-
-        if withdraw.status == "REJECTED":
-            return Response({"error": ["Already rejected."], "code": "rejected"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"status": "successfully verify the withdraw status."}, status=status.HTTP_204_NO_CONTENT)
 
-        if withdraw_status == "VERIFIED":
-            withdraw.verify()
-        elif withdraw_status == "REJECTED":
-            withdraw.reject()
 
-        return Response({"status": "successfully verify the withdraw status."}, status=status.HTTP_204_NO_CONTENT)
+class WithdrawBulkVerifyView(BulkVerifyView):
+    """
+    Allowed Method: PUT, PATCH
+    PUT, PATCH   api/withdraw/requests/bulk/ - Verify many Withdraw Requests at once
+    """
+    model = WithdrawRequest
 
 
 class CampaignListProposal(generics.ListAPIView, generics.UpdateAPIView):
@@ -252,7 +435,7 @@ class CampaignListProposal(generics.ListAPIView, generics.UpdateAPIView):
     PUT, PATCH   api/admin/proposals/ - Verify campaign proposal by campaign id
     """
     permission_classes = [permissions.IsAdminUser]
-    queryset = Campaign.objects.filter(status="PENDING")
+    queryset = Campaign.objects.with_fundraiser().filter(status="PENDING")
     serializer_class = CampaignListProposalSerializer
 
     def update(self, request, *args, **kwargs):
@@ -260,7 +443,7 @@ class CampaignListProposal(generics.ListAPIView, generics.UpdateAPIView):
             campaign_id = request.data.get("id")
             campaign = Campaign.objects.get(id=campaign_id)
             campaign.status = request.data.get("status")
-            campaign.save()
+            campaign.save_status()
 
             serializer = self.get_serializer(data=campaign, many=False)
             if serializer.is_valid():
@@ -277,12 +460,12 @@ class CampaignListProposalById(generics.RetrieveUpdateAPIView):
     PUT, PATCH   api/admin/proposals/<int:id>/ - Verify (status) proposal request by id
     """
     permission_classes = [permissions.IsAdminUser]
-    queryset = Campaign.objects.filter(status="PENDING")
+    queryset = Campaign.objects.with_fundraiser().filter(status="PENDING")
     serializer_class = CampaignListProposalByIdSerializer
 
     def get(self, request, pk):
         try:
-            campaign = Campaign.objects.get(pk=pk)
+            campaign = Campaign.objects.with_fundraiser().get(pk=pk)
             serializer = self.get_serializer(campaign, many=False)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Campaign.DoesNotExist:
@@ -292,7 +475,7 @@ class CampaignListProposalById(generics.RetrieveUpdateAPIView):
         try:
             campaign = Campaign.objects.get(pk=pk)
             campaign.status = request.data.get("status")
-            campaign.save()
+            campaign.save_status()
 
             serializer = self.get_serializer(data=campaign, many=False)
             if serializer.is_valid():
@@ -311,11 +494,16 @@ class NotificationCountView(views.APIView):
     permission_classes = (permissions.IsAdminUser, )
 
     def get(self, request, format=None):
-        top_up_count = TopUpHistory.objects.filter(status="PENDING").count()
-        fundraiser_request_count = User.objects.filter(
-            role="FUNDRAISER", verified=False).count()
-        new_campaign_count = Campaign.objects.filter(status="PENDING").count()
-        withdraw_request_count = WithdrawRequest.objects.filter(
-            status="PENDING").count()
-
-        return Response({"top_up": top_up_count, "fundraiser_request": fundraiser_request_count, "new_campaign": new_campaign_count, "withdraw_request": withdraw_request_count})
+        return Response(get_notification_counts())
+
+
+class FeedCacheStatsView(views.APIView):
+    """
+    Allowed Method: GET
+    GET     api/admin/feed-cache/     hit ratio of the campaign feed cache
+    """
+
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request, format=None):
+        return Response(get_feed_cache_stats())
@@ -0,0 +1,9 @@
+import os
+
+# SERVER_MODE=asgi serves app.asgi through uvicorn workers, with the read-heavy
+# endpoints running as async views. Anything else keeps the sync WSGI workers.
+if os.environ.get("SERVER_MODE", "wsgi").lower() == "asgi":
+    wsgi_app = "app.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "app.wsgi:application"
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import permissions
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+# User fields copied into the JWT so permission checks can run without a query.
+USER_CLAIMS = ("role", "verified", "is_staff", "is_active")
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class UserClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that builds request.user from the token claims on
+    read-only requests instead of selecting the User row.
+
+    The user is a deferred instance holding only id, role, verified,
+    is_staff and is_active; any other field is loaded lazily on access.
+    Claims are refreshed with every token refresh, which refuses inactive
+    users, so they are at most ACCESS_TOKEN_LIFETIME old. Writes, tokens minted without the claims and
+    tokens of staff users still load the row, so a deactivated or demoted
+    admin loses access to admin endpoints at once.
+    """
+
+    def authenticate(self, request):
+        if not settings.JWT_USER_CLAIMS_AUTH or request.method not in permissions.SAFE_METHODS:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_claims_user(validated_token)
+        if user is None:
+            user = self.get_user(validated_token)
+        return user, validated_token
+
+    def get_claims_user(self, validated_token):
+        if not all(claim in validated_token for claim in (api_settings.USER_ID_CLAIM, *USER_CLAIMS)):
+            return None
+        if validated_token["is_staff"]:
+            return None
+        if not validated_token["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        claims = {claim: validated_token[claim] for claim in USER_CLAIMS}
+        claims[api_settings.USER_ID_FIELD] = validated_token[api_settings.USER_ID_CLAIM]
+        field_names = [field.attname for field in User._meta.concrete_fields
+                       if field.attname in claims]
+        return User.from_db(router.db_for_read(User), field_names,
+                            [claims[name] for name in field_names])
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (Argon2PasswordHasher,
+                                         PBKDF2PasswordHasher)
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with settings.PASSWORD_PBKDF2_ITERATIONS. Hashes with any other
+    count still verify and are rehashed on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2 with settings.PASSWORD_ARGON2_TIME_COST and
+    PASSWORD_ARGON2_MEMORY_COST (KiB).
+    """
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
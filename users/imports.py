@@ -0,0 +1,154 @@
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import FundraiserProposal, User
+
+COLUMNS = ("email", "first_name", "last_name", "password", "role", "proposal_text")
+PASSWORD_MIN_LENGTH = 8
+
+
+def setup_worker():
+    # Spawned (not forked) workers start without a configured Django.
+    django.setup()
+
+
+def clean_row(row):
+    """
+    Validate one CSV row the way create_user() would.
+    Returns (cleaned values, {column: [messages]}).
+    """
+    values = {column: (row.get(column) or "").strip() for column in COLUMNS}
+    values["email"] = User.objects.normalize_email(values["email"])
+    values["role"] = values["role"].upper() or None
+    errors = {}
+
+    for column in ("email", "first_name", "last_name", "role"):
+        try:
+            User._meta.get_field(column).clean(values[column], None)
+        except ValidationError as e:
+            errors[column] = e.messages
+    if len(values["password"]) < PASSWORD_MIN_LENGTH:
+        errors["password"] = [f"Ensure this field has at least {PASSWORD_MIN_LENGTH} characters."]
+    if values["role"] == "FUNDRAISER" and not values["proposal_text"]:
+        errors["proposal_text"] = ["proposal_text is required for role FUNDRAISER."]
+    return values, errors
+
+
+class UserImport:
+    """
+    Create users from CSV rows in batches: one query checks the emails of a
+    batch, a process pool hashes its passwords, and bulk_create inserts the
+    users and their fundraiser proposals.
+
+    Rows are read lazily, so only one batch is held in memory. Invalid rows,
+    including those whose email another request registers while the batch
+    is imported, are skipped and reported in errors as
+    {"line", "email", "errors"}.
+    """
+
+    def __init__(self, batch_size=1000, workers=None, progress=None):
+        self.batch_size = batch_size
+        self.workers = os.cpu_count() if workers is None else workers
+        self.progress = progress
+        self.processed = 0
+        self.created = 0
+        self.errors = []
+        self.seen_emails = set()
+
+    def run(self, rows):
+        """
+        rows is an iterable of dicts, e.g. a csv.DictReader. The first data
+        row is reported as line 2, after the header.
+        """
+        lines = enumerate(rows, start=2)
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(self.workers, initializer=setup_worker)
+        try:
+            while True:
+                batch = list(itertools.islice(lines, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch, pool)
+                self.processed += len(batch)
+                if self.progress:
+                    self.progress(self)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return self
+
+    def run_csv(self, file):
+        return self.run(csv.DictReader(file))
+
+    def import_batch(self, batch, pool):
+        valid = []
+        for line, row in batch:
+            values, errors = clean_row(row)
+            if not errors and values["email"] in self.seen_emails:
+                errors["email"] = ["Duplicate email in this file."]
+            if errors:
+                self.errors.append({"line": line, "email": values["email"], "errors": errors})
+                continue
+            self.seen_emails.add(values["email"])
+            valid.append((line, values))
+
+        valid = self.drop_existing(valid)
+        if not valid:
+            return
+
+        passwords = [values.pop("password") for _, values in valid]
+        if pool is not None:
+            chunksize = max(len(passwords) // (self.workers * 4), 1)
+            hashes = list(pool.map(make_password, passwords, chunksize=chunksize))
+        else:
+            hashes = list(map(make_password, passwords))
+
+        rows = [(line, values, password) for (line, values), password in zip(valid, hashes)]
+        while rows:
+            try:
+                self.insert([(values, password) for _, values, password in rows])
+                return
+            except IntegrityError:
+                # Some of the emails were registered since drop_existing().
+                kept = {line for line, _ in self.drop_existing([(line, values) for line, values, _ in rows])}
+                if len(kept) == len(rows):
+                    raise
+                rows = [row for row in rows if row[0] in kept]
+
+    def drop_existing(self, valid):
+        """
+        Report the (line, values) rows whose email already has a user and
+        return the others.
+        """
+        existing = set(User.objects.filter(email__in=[values["email"] for _, values in valid])
+                       .values_list("email", flat=True))
+        for line, values in valid:
+            if values["email"] in existing:
+                self.errors.append({"line": line, "email": values["email"],
+                                    "errors": {"email": ["User with this Email address already exists."]}})
+        return [(line, values) for line, values in valid if values["email"] not in existing]
+
+    def insert(self, rows):
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                User(email=values["email"], first_name=values["first_name"], last_name=values["last_name"],
+                     role=values["role"], password=password)
+                for values, password in rows)
+            proposals = {values["email"]: values["proposal_text"]
+                         for values, _ in rows if values["role"] == "FUNDRAISER"}
+            if proposals:
+                # Not every backend returns primary keys from bulk_create.
+                ids = {user.email: user.pk for user in users}
+                if None in ids.values():
+                    ids = dict(User.objects.filter(email__in=proposals).values_list("email", "id"))
+                FundraiserProposal.objects.bulk_create(
+                    FundraiserProposal(fundraiser_id=ids[email], text=text) for email, text in proposals.items())
+        self.created += len(users)
@@ -0,0 +1,46 @@
+import csv
+import json
+import sys
+
+from campaign.cache import invalidate_notification_counts
+from django.core.management.base import BaseCommand, CommandError
+
+from users.imports import COLUMNS, UserImport
+
+
+class Command(BaseCommand):
+    help = (f"Create users from a CSV file with the columns {', '.join(COLUMNS)}. "
+            "Invalid rows are skipped and reported.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file", help="Path of the CSV file, - for stdin.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int,
+                            help="Password hashing processes, defaults to the CPU count. 1 hashes in this process.")
+        parser.add_argument("--errors", help="Write the rejected rows as JSON to this file.")
+
+    def handle(self, *args, **options):
+        user_import = UserImport(batch_size=options["batch_size"], workers=options["workers"],
+                                 progress=self.report_progress)
+        try:
+            if options["csv_file"] == "-":
+                user_import.run_csv(sys.stdin)
+            else:
+                with open(options["csv_file"], newline="", encoding="utf-8-sig") as f:
+                    user_import.run_csv(f)
+        except (OSError, csv.Error) as e:
+            raise CommandError(str(e))
+        finally:
+            invalidate_notification_counts()
+
+        for error in user_import.errors:
+            self.stderr.write(f"line {error['line']} ({error['email']}): {json.dumps(error['errors'])}")
+        if options["errors"]:
+            with open(options["errors"], "w") as f:
+                json.dump(user_import.errors, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {user_import.created} user(s), rejected {len(user_import.errors)} row(s)."))
+
+    def report_progress(self, user_import):
+        self.stdout.write(f"{user_import.processed} row(s) processed, {user_import.created} created, "
+                          f"{len(user_import.errors)} rejected")
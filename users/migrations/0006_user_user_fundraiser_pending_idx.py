@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_auto_20210810_2011'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('role', 'FUNDRAISER'), ('verified', False)), fields=['id'], name='user_fundraiser_pending_idx'),
+        ),
+    ]
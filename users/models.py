@@ -22,6 +22,12 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["id"], name="user_fundraiser_pending_idx",
+                         condition=models.Q(role="FUNDRAISER", verified=False)),
+        ]
+
     def verify_fundraiser(self):
         if self.role == "FUNDRAISER":
             self.verified = True
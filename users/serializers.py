@@ -1,6 +1,13 @@
 from campaign.models import Campaign
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import (TokenObtainPairSerializer,
+                                                  TokenRefreshSerializer)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from .authentication import add_user_claims
 from .models import User
 
 
@@ -44,3 +51,20 @@ class MeSerializer(serializers.ModelSerializer):
         fields = ('id', 'first_name', 'last_name', 'email',
                   'role', 'is_staff', 'wallet_amount', 'verified')
         read_only_fields = ('is_staff', 'role', 'wallet_amount', 'verified')
+
+
+class UserClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class UserClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs["refresh"])
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        add_user_claims(refresh, user)
+        return super().validate({"refresh": str(refresh)})
@@ -1,7 +1,21 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
+from .imports import UserImport
 from .models import FundraiserProposal, User
 
 
@@ -203,3 +217,207 @@ class VerifyFundraiserViewsTests(TestCase):
 
         fundraiser_verified = User.objects.get(id=new_fundraiser.id)
         self.assertEqual(fundraiser_verified.verified, True)
+
+
+@override_settings(JWT_USER_CLAIMS_AUTH=True)
+class UserClaimsAuthenticationTests(TestCase):
+    AUTH_URL = 'http://127.0.0.1:8000/api'
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(
+            first_name="Te", last_name="st", email="fund@gmail.com",
+            password="tester41", role="FUNDRAISER", proposal_text="proposal")
+
+    def login(self):
+        return self.client.post(f"{self.AUTH_URL}/login/", {
+            "email": "fund@gmail.com", "password": "tester41"}).json()
+
+    def test_read_skips_user_query(self):
+        access = self.login()["access"]
+        # Only the withdraw list itself is queried, not the user row.
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                f"{self.AUTH_URL}/withdraw/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(JWT_USER_CLAIMS_AUTH=False)
+    def test_read_loads_user_by_default(self):
+        access = self.login()["access"]
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.get(
+            f"{self.AUTH_URL}/withdraw/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_me_view_loads_full_user(self):
+        access = self.login()["access"]
+        response = self.client.get(
+            f"{self.AUTH_URL}/me/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json().get("email"), "fund@gmail.com")
+        self.assertEqual(response.json().get("first_name"), "Te")
+
+    def test_inactive_user_refused(self):
+        access = AccessToken(self.login()["access"])
+        access["is_active"] = False
+        response = self.client.get(
+            f"{self.AUTH_URL}/withdraw/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Deactivated users can't refresh their claims.
+        refresh = self.login()["refresh"]
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(f"{self.AUTH_URL}/refresh/", {"refresh": refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_staff_claims_not_trusted(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        access = self.login()["access"]
+        User.objects.filter(pk=self.user.pk).update(is_staff=False)
+
+        response = self.client.get(
+            f"{self.AUTH_URL}/topup/requests/", HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_refresh_updates_claims(self):
+        refresh = self.login()["refresh"]
+        self.assertFalse(RefreshToken(refresh)["verified"])
+
+        self.user.verify_fundraiser()
+        access = self.client.post(
+            f"{self.AUTH_URL}/refresh/", {"refresh": refresh}).json()["access"]
+        self.assertTrue(AccessToken(access)["verified"])
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000, PASSWORD_ARGON2_TIME_COST=1, PASSWORD_ARGON2_MEMORY_COST=1024)
+class PasswordHashPolicyTests(TestCase):
+    LOGIN_URL = 'http://127.0.0.1:8000/api/login/'
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            first_name="Te", last_name="st", email="hash@gmail.com", password="tester41")
+
+    def login(self):
+        response = self.client.post(self.LOGIN_URL, {"email": "hash@gmail.com", "password": "tester41"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return User.objects.get(pk=self.user.pk).password
+
+    def test_new_password_uses_policy(self):
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+
+    def test_login_rehashes_changed_iterations(self):
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.assertTrue(self.login().startswith("pbkdf2_sha256$2000$"))
+        self.assertTrue(self.login().startswith("pbkdf2_sha256$1000$"))
+
+    def test_login_rehashes_to_argon2_policy(self):
+        argon2 = settings.PASSWORD_HASH_POLICIES["argon2"]
+        with self.settings(PASSWORD_HASHERS=[argon2, *(h for h in settings.PASSWORD_HASHERS if h != argon2)]):
+            self.assertTrue(self.login().startswith("argon2$"))
+            self.assertTrue(self.login().startswith("argon2$argon2id$v=19$m=1024,t=1,"))
+        # Switching back keeps the argon2 users able to log in.
+        self.assertTrue(self.login().startswith("pbkdf2_sha256$1000$"))
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class UserImportTests(TestCase):
+    HEADER = "email,first_name,last_name,password,role,proposal_text\n"
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create_superuser(
+            first_name="Te", last_name="st", email="admin@admin.com", password="admin1234")
+
+    def csv_rows(self, count, start=0):
+        return "".join(f"donor{i}@Partner.org,Do,nor{i},password{i},donatur,\n" for i in range(start, start + count))
+
+    def write_csv(self, content):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w") as f:
+            f.write(self.HEADER + content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_command_imports_and_reports_errors(self):
+        path = self.write_csv(
+            self.csv_rows(3)
+            + "fund@partner.org,Fund,Raiser,password1,FUNDRAISER,Help us\n"
+            + "admin@admin.com,Ad,Min,password1,,\n"
+            + "donor0@partner.org,Du,Plicate,password1,,\n"
+            + "nofund@partner.org,No,Proposal,password1,FUNDRAISER,\n"
+            + "short@partner.org,Sh,Ort,short,,\n"
+            + "not-an-email,Bad,Email,password1,ADMIN,\n")
+        errors_path = path + ".errors.json"
+        self.addCleanup(lambda: os.path.exists(errors_path) and os.remove(errors_path))
+        out, err = StringIO(), StringIO()
+        call_command("import_users", path, "--batch-size", "4", "--workers", "2",
+                     "--errors", errors_path, stdout=out, stderr=err)
+
+        self.assertIn("Created 4 user(s), rejected 5 row(s).", out.getvalue())
+        self.assertIn("8 row(s) processed", out.getvalue())
+        donor = User.objects.get(email="donor1@partner.org")
+        self.assertEqual(donor.role, "DONATUR")
+        self.assertTrue(donor.check_password("password1"))
+        fundraiser = User.objects.get(email="fund@partner.org")
+        self.assertEqual(fundraiser.fundraiser_proposal.text, "Help us")
+
+        with open(errors_path) as f:
+            errors = {error["line"]: error["errors"] for error in json.load(f)}
+        self.assertEqual(sorted(errors), [6, 7, 8, 9, 10])
+        self.assertIn("already exists", errors[6]["email"][0])
+        self.assertIn("Duplicate", errors[7]["email"][0])
+        self.assertIn("proposal_text", errors[8])
+        self.assertIn("password", errors[9])
+        self.assertEqual(set(errors[10]), {"email", "role"})
+
+    def test_batch_queries_do_not_grow_with_rows(self):
+        def count_queries(rows, start):
+            with CaptureQueriesContext(connection) as context:
+                UserImport(workers=1).run_csv(StringIO(self.HEADER + self.csv_rows(rows, start)))
+            return len(context.captured_queries)
+
+        self.assertEqual(count_queries(2, 0), count_queries(20, 100))
+        self.assertEqual(User.objects.filter(role="DONATUR").count(), 22)
+
+    def test_admin_endpoint(self):
+        self.client.login(email="admin@admin.com", password="admin1234")
+        upload = SimpleUploadedFile("users.csv", (self.HEADER + self.csv_rows(2) + "bad,,,,,\n").encode())
+        response = self.client.post("http://127.0.0.1:8000/api/admin/users/import/", {"file": upload})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["created"], 2)
+        self.assertEqual(response.json()["processed"], 3)
+        self.assertEqual(response.json()["errors"][0]["line"], 4)
+
+        response = self.client.post("http://127.0.0.1:8000/api/admin/users/import/", {})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(USER_IMPORT_MAX_ROWS=2)
+    def test_admin_endpoint_row_cap(self):
+        self.client.login(email="admin@admin.com", password="admin1234")
+        upload = SimpleUploadedFile("users.csv", (self.HEADER + self.csv_rows(3)).encode())
+        response = self.client.post("http://127.0.0.1:8000/api/admin/users/import/", {"file": upload})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("import_users", response.json()["file"][0])
+        self.assertFalse(User.objects.filter(role="DONATUR").exists())
+
+    def test_email_registered_during_import(self):
+        def make_password(password):
+            # Someone registers donor1 while the batch is being hashed.
+            if not User.objects.filter(email="donor1@partner.org").exists():
+                User.objects.create_user(
+                    first_name="Do", last_name="nor", email="donor1@partner.org", password="password1")
+            return hashers.make_password(password)
+
+        with mock.patch("users.imports.make_password", side_effect=make_password):
+            user_import = UserImport(workers=1).run_csv(StringIO(self.HEADER + self.csv_rows(3)))
+
+        self.assertEqual(user_import.created, 2)
+        self.assertEqual([(error["line"], error["email"]) for error in user_import.errors],
+                         [(3, "donor1@partner.org")])
+        self.assertEqual(User.objects.filter(email__startswith="donor").count(), 3)
@@ -1,11 +1,22 @@
+import csv
+import io
+import itertools
+
+from campaign.cache import invalidate_notification_counts
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from rest_framework import generics, permissions, status
+from rest_framework import generics, permissions, status, views
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import (TokenObtainPairView,
+                                            TokenRefreshView)
 
+from .imports import UserImport
 from .models import FundraiserProposal, User
 from .serializers import (FundraiserRequestSerializer, MeSerializer,
-                          RegisterSerializer, FundraiserRequestByIdSerializer)
+                          RegisterSerializer, FundraiserRequestByIdSerializer,
+                          UserClaimsTokenObtainPairSerializer,
+                          UserClaimsTokenRefreshSerializer)
 
 
 class RegisterView(generics.CreateAPIView):
@@ -24,12 +35,26 @@ class RegisterView(generics.CreateAPIView):
             except ValueError as e:
                 return Response({"proposal_text": [str(e)]}, status=status. HTTP_400_BAD_REQUEST)
 
-            refresh = RefreshToken.for_user(user)
+            refresh = UserClaimsTokenObtainPairSerializer.get_token(user)
             return Response({"access": str(refresh.access_token), "refresh": str(refresh)}, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class LoginView(TokenObtainPairView):
+    """
+    POST     api/login/ - Obtain access and refresh token pair
+    """
+    serializer_class = UserClaimsTokenObtainPairSerializer
+
+
+class RefreshView(TokenRefreshView):
+    """
+    POST     api/refresh/ - Refresh access token
+    """
+    serializer_class = UserClaimsTokenRefreshSerializer
+
+
 class FundraiserRequestView(generics.ListAPIView, generics.UpdateAPIView):
     """
     ADMIN ONLY
@@ -78,4 +103,40 @@ class MeView(generics.RetrieveAPIView):
     serializer_class = MeSerializer
 
     def get_object(self):
-        return self.request.user
+        # request.user may only carry the token claims, load the full row.
+        return User.objects.get(pk=self.request.user.pk)
+
+
+class UserImportView(views.APIView):
+    """
+    POST     api/admin/users/import/ - Create users from an uploaded CSV file
+             (multipart field "file") with the columns of users.imports.COLUMNS,
+             up to USER_IMPORT_MAX_ROWS rows
+    """
+    permission_classes = (permissions.IsAdminUser, )
+    parser_classes = (MultiPartParser, )
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"file": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_rows = settings.USER_IMPORT_MAX_ROWS
+        try:
+            rows = list(itertools.islice(csv.DictReader(
+                io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")), max_rows + 1))
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response({"file": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > max_rows:
+            return Response({"file": [f"At most {max_rows} rows can be uploaded at once, "
+                                      "import larger files with the import_users command."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        user_import = UserImport(workers=settings.USER_IMPORT_WORKERS)
+        try:
+            user_import.run(rows)
+        finally:
+            invalidate_notification_counts()
+
+        return Response({"processed": user_import.processed, "created": user_import.created,
+                         "errors": user_import.errors})
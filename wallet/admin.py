@@ -2,4 +2,22 @@ from django.contrib import admin
 
 from .models import *
 
-admin.site.register((TopUpHistory, WithdrawRequest, DonationHistory))
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    """
+    Admin for rows only ever written by code: the ledger and its snapshots
+    can be browsed but not added, changed or deleted.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register((TopUpHistory, WithdrawRequest, DonationHistory, IdempotencyKey))
+admin.site.register((LedgerEntry, WalletSnapshot), ReadOnlyAdmin)
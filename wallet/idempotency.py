@@ -0,0 +1,66 @@
+import functools
+import hashlib
+
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from wallet.models import IdempotencyKey
+
+
+def in_progress():
+    response = Response({"status": "A request with this Idempotency-Key is still in progress."},
+                        status=status.HTTP_409_CONFLICT)
+    response["Retry-After"] = "1"
+    return response
+
+
+def idempotent(create):
+    """
+    Make a view's create() idempotent per user and Idempotency-Key header.
+
+    The first request with a key runs create() in a transaction that also
+    stores its response, and retries get that response back with an
+    Idempotent-Replayed header instead of running it again. A retry arriving
+    while the first request still runs gets a 409 right away rather than
+    waiting on a lock. Error responses aren't stored, so the request can be
+    retried with the same key once fixed. Requests without the header run
+    as before.
+    """
+    @functools.wraps(create)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            return create(view, request, *args, **kwargs)
+        if not 0 < len(key) <= IdempotencyKey.KEY_LENGTH:
+            return Response({"status": f"Idempotency-Key must be 1 to {IdempotencyKey.KEY_LENGTH} characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = hashlib.sha256(
+            f"{request.method} {request.path}\n".encode() + request.body).hexdigest()
+        record, claimed = IdempotencyKey.objects.claim(request.user, key, fingerprint)
+        if not claimed:
+            if record is not None and record.fingerprint != fingerprint:
+                return Response({"status": "Idempotency-Key was already used for another request."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record is None or record.status_code is None:
+                return in_progress()
+            response = Response(record.response, status=record.status_code)
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            with transaction.atomic():
+                response = create(view, request, *args, **kwargs)
+                if not status.is_success(response.status_code):
+                    record.release()
+                elif not record.complete(response):
+                    # The lease ran out and a retry took the key over.
+                    transaction.set_rollback(True)
+                    response = in_progress()
+        except Exception:
+            record.release()
+            raise
+        return response
+
+    return wrapper
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from wallet.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than IDEMPOTENCY_KEY_TTL, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=10000,
+            help="Keys deleted per DELETE, so no statement holds its locks for long.")
+
+    def handle(self, *args, **options):
+        purged = 0
+        while True:
+            ids = list(IdempotencyKey.objects.expired().order_by()
+                       .values_list("id", flat=True)[:options["batch_size"]])
+            if not ids:
+                break
+            purged += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} idempotency key(s)."))
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+from users.models import User
+
+from wallet.models import LedgerEntry, WalletSnapshot, wallet_balances
+
+
+class Command(BaseCommand):
+    help = ("Snapshot the ledger balance of every wallet with new entries, or compare "
+            "User.wallet_amount with the ledger with --check.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only compare wallet_amount with the ledger and report drift.")
+
+    def check(self):
+        total = LedgerEntry.objects.aggregate(total=Sum("amount"))["total"] or 0
+        if total:
+            raise CommandError(f"Ledger entries sum to {total} instead of 0.")
+
+        drifted = (wallet_balances(User.objects.all())
+                   .exclude(wallet_amount=F("ledger_balance"))
+                   .order_by("id").values_list("id", "wallet_amount", "ledger_balance"))
+        count = 0
+        for user_id, wallet_amount, ledger_balance in drifted.iterator():
+            self.stdout.write(f"user {user_id}: wallet_amount {wallet_amount}, ledger {ledger_balance}")
+            count += 1
+        if count:
+            raise CommandError(f"{count} wallet(s) drifted.")
+        self.stdout.write(self.style.SUCCESS("Wallets are in sync with the ledger."))
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            return self.check()
+
+        cutoff = timezone.now() - timedelta(seconds=settings.WALLET_SNAPSHOT_LAG_SECONDS)
+        through = LedgerEntry.objects.filter(
+            created_at__lte=cutoff).aggregate(last=Max("id"))["last"]
+        if through is None:
+            self.stdout.write(self.style.SUCCESS("No ledger entries to snapshot."))
+            return
+
+        users = (wallet_balances(User.objects.all(), through=through)
+                 .filter(moved_at__isnull=False)
+                 .values_list("id", "ledger_balance", "snapshot_taken_at", "moved_at"))
+        snapshots = WalletSnapshot.objects.bulk_create(
+            WalletSnapshot(user_id=user_id, balance=balance, last_entry=through,
+                           taken_at=max(filter(None, (taken_at, moved_at))))
+            for user_id, balance, taken_at, moved_at in users.iterator())
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {len(snapshots)} wallet(s) through ledger entry {through}."))
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.6 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0005_auto_20210813_2250'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donationhistory',
+            index=models.Index(fields=['user', '-date'], name='donation_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donationhistory',
+            index=models.Index(fields=['campaign', 'user'], name='donation_campaign_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topuphistory',
+            index=models.Index(fields=['user', '-date'], name='topup_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topuphistory',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-date'], name='topup_pending_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawrequest',
+            index=models.Index(fields=['user', '-request_date'], name='withdraw_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawrequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-request_date'], name='withdraw_pending_date_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2.6 on 2026-10-17 21:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0006_auto_20261018_0336'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='donationhistory',
+            options={'ordering': ('-date', '-id')},
+        ),
+        migrations.AlterModelOptions(
+            name='topuphistory',
+            options={'ordering': ('-date', '-id')},
+        ),
+        migrations.AlterModelOptions(
+            name='withdrawrequest',
+            options={'ordering': ('-request_date', '-id')},
+        ),
+        migrations.RemoveIndex(
+            model_name='donationhistory',
+            name='donation_user_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='topuphistory',
+            name='topup_user_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='topuphistory',
+            name='topup_pending_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='withdrawrequest',
+            name='withdraw_user_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='withdrawrequest',
+            name='withdraw_pending_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='donationhistory',
+            index=models.Index(fields=['user', '-date', '-id'], name='donation_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topuphistory',
+            index=models.Index(fields=['user', '-date', '-id'], name='topup_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topuphistory',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-date', '-id'], name='topup_pending_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawrequest',
+            index=models.Index(fields=['user', '-request_date', '-id'], name='withdraw_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawrequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-request_date', '-id'], name='withdraw_pending_date_idx'),
+        ),
+    ]
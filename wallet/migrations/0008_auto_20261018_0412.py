@@ -0,0 +1,78 @@
+# Generated by Django 3.2.6 on 2026-10-17 21:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_wallet_ledgers(apps, schema_editor):
+    """
+    Carry every existing balance into the ledger as a transfer from BANK, so
+    the wallet entries of each user sum to its wallet_amount.
+    """
+    User = apps.get_model('users', 'User')
+    LedgerEntry = apps.get_model('wallet', 'LedgerEntry')
+    balances = User.objects.filter(wallet_amount__gt=0).values_list('id', 'wallet_amount')
+    LedgerEntry.objects.bulk_create(
+        leg for user_id, amount in balances.iterator() for leg in (
+            LedgerEntry(account='BANK', kind='OPENING', reference=user_id, amount=-amount),
+            LedgerEntry(account='WALLET', user_id=user_id, kind='OPENING', reference=user_id, amount=amount)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('campaign', '0012_auto_20261018_0346'),
+        ('wallet', '0007_auto_20261018_0407'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.BigIntegerField()),
+                ('last_entry', models.PositiveBigIntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallet_snapshots', related_query_name='wallet_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-taken_at', '-id'),
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('account', models.CharField(choices=[('WALLET', 'WALLET'), ('CAMPAIGN', 'CAMPAIGN'), ('BANK', 'BANK'), ('HOLD', 'HOLD')], max_length=25)),
+                ('kind', models.CharField(choices=[('OPENING', 'OPENING'), ('TOPUP', 'TOPUP'), ('DONATION', 'DONATION'), ('WITHDRAW_REQUEST', 'WITHDRAW_REQUEST'), ('WITHDRAW', 'WITHDRAW'), ('WITHDRAW_REVERSAL', 'WITHDRAW_REVERSAL')], max_length=25)),
+                ('reference', models.PositiveBigIntegerField()),
+                ('amount', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('campaign', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', related_query_name='ledger_entries', to='campaign.campaign')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', related_query_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'ledger entries',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='walletsnapshot',
+            index=models.Index(fields=['user', '-taken_at', '-id'], name='snapshot_user_taken_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(condition=models.Q(('account', 'WALLET')), fields=['user', 'id'], name='ledger_wallet_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(condition=models.Q(('account', 'WALLET')), fields=['user', 'created_at'], name='ledger_wallet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['kind', 'reference'], name='ledger_reference_idx'),
+        ),
+        migrations.RunPython(open_wallet_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.6 on 2026-10-17 21:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaign', '0013_feedversion'),
+        ('wallet', '0009_auto_20261018_0415'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='campaign',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', related_query_name='ledger_entries', to='campaign.campaign'),
+        ),
+    ]
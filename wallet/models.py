@@ -1,7 +1,52 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+# Ledger accounts outside any wallet or campaign: money entering through top
+# ups, and withdraws requested from a campaign but not yet paid out.
+BANK = {"account": "BANK"}
+HOLD = {"account": "HOLD"}
+
+
+def wallet_account(user_id):
+    return {"account": "WALLET", "user_id": user_id}
+
+
+def campaign_account(campaign_id):
+    return {"account": "CAMPAIGN", "campaign_id": campaign_id}
+
+
+def increment_by_pk(model, field, amounts, **updates):
+    """
+    Add amounts[pk] to field of every row in amounts with a single UPDATE,
+    also setting any extra column given in updates.
+    """
+    if not amounts:
+        return
+    model.objects.filter(pk__in=amounts.keys()).update(**updates, **{field: F(field) + Case(
+        *(When(pk=pk, then=Value(amount)) for pk, amount in amounts.items()),
+        default=Value(0))})
+
+
+def leave_pending(instance, status, **updates):
+    """
+    Move a pending request to status with a single guarded UPDATE, so a
+    stale copy of a request someone already handled can't apply it twice.
+    Returns whether this call made the change.
+    """
+    changed = type(instance).objects.filter(pk=instance.pk, status="PENDING").update(status=status, **updates)
+    if changed:
+        instance.status = status
+        for field, value in updates.items():
+            setattr(instance, field, value)
+    return bool(changed)
+
 
 class TopUpHistory(models.Model):
     user = models.ForeignKey("users.User", on_delete=models.CASCADE,
@@ -21,23 +66,65 @@ class TopUpHistory(models.Model):
         max_length=255, validators=(RegexValidator(r'^[0-9]+$', "Number only"), ))
 
     def verify(self):
-        if self.status == "PENDING":
-            self.status = "VERIFIED"
-            self.save()
-            user = self.user
-            user.wallet_amount += self.amount
-            user.save()
+        from users.models import User
+
+        with transaction.atomic():
+            if not leave_pending(self, "VERIFIED"):
+                return False
+            increment_by_pk(User, "wallet_amount", {self.user_id: self.amount})
+            LedgerEntry.post(LedgerEntry.transfer(
+                "TOPUP", self.pk, self.amount, BANK, wallet_account(self.user_id)))
+        return True
 
     def reject(self):
-        if self.status == "PENDING":
-            self.status = "REJECTED"
-            self.save()
+        return leave_pending(self, "REJECTED")
+
+    @classmethod
+    def verify_many(cls, statuses):
+        """
+        Apply {id: "VERIFIED" | "REJECTED"} in one transaction with a single
+        bulk_update of the top ups, a single UPDATE crediting every wallet and
+        a single INSERT of their ledger entries.
+        Returns {id: error code} for the ids that were not pending.
+        """
+        from users.models import User
+
+        errors = {}
+        with transaction.atomic():
+            top_ups = cls.objects.select_for_update().in_bulk(statuses.keys())
+            credits = {}
+            transfers = []
+            for id, top_up_status in statuses.items():
+                top_up = top_ups.get(id)
+                if top_up is None:
+                    errors[id] = "not-found"
+                    continue
+                if top_up.status != "PENDING":
+                    errors[id] = top_up.status.lower()
+                    continue
+                top_up.status = top_up_status
+                if top_up_status == "VERIFIED":
+                    credits[top_up.user_id] = credits.get(
+                        top_up.user_id, 0) + top_up.amount
+                    transfers.append(LedgerEntry.transfer(
+                        "TOPUP", top_up.pk, top_up.amount, BANK, wallet_account(top_up.user_id)))
+
+            cls.objects.bulk_update(
+                [top_up for id, top_up in top_ups.items() if id not in errors], ["status"])
+            increment_by_pk(User, "wallet_amount", credits)
+            LedgerEntry.post(*transfers)
+        return errors
 
     def __str__(self) -> str:
         return f"{self.user.id} {self.date}"
 
     class Meta:
-        ordering = ("-date", )
+        ordering = ("-date", "-id")
+        indexes = [
+            models.Index(fields=["user", "-date", "-id"], name="topup_user_date_idx"),
+            models.Index(fields=["-date", "-id"], name="topup_pending_date_idx",
+                         condition=models.Q(status="PENDING")),
+        ]
 
 
 class WithdrawRequest(models.Model):
@@ -54,28 +141,87 @@ class WithdrawRequest(models.Model):
         ("PENDING", "PENDING"), ("VERIFIED", "VERIFIED"), ("REJECTED", "REJECTED")), default="PENDING")
 
     def verify(self):
-        if self.status == "PENDING":
-            self.status = "VERIFIED"
-            self.verified_date = timezone.now()
-            self.save()
-            user = self.user
-            user.wallet_amount += self.amount
-            user.save()
+        from users.models import User
+
+        with transaction.atomic():
+            if not leave_pending(self, "VERIFIED", verified_date=timezone.now()):
+                return False
+            increment_by_pk(User, "wallet_amount", {self.user_id: self.amount})
+            LedgerEntry.post(LedgerEntry.transfer(
+                "WITHDRAW", self.pk, self.amount, HOLD, wallet_account(self.user_id)))
+        return True
 
     def reject(self):
-        if self.status == "PENDING":
-            self.status = "REJECTED"
-            self.verified_date = timezone.now()
-            campaign = self.campaign
-            campaign.withdraw_amount -= self.amount
-            campaign.save()
-            self.save()
+        from campaign.models import Campaign
+
+        with transaction.atomic():
+            if not leave_pending(self, "REJECTED", verified_date=timezone.now()):
+                return False
+            increment_by_pk(Campaign, "withdraw_amount", {self.campaign_id: -self.amount},
+                            updated_at=self.verified_date)
+            LedgerEntry.post(LedgerEntry.transfer(
+                "WITHDRAW_REVERSAL", self.pk, self.amount, HOLD, campaign_account(self.campaign_id)))
+        return True
+
+    @classmethod
+    def verify_many(cls, statuses):
+        """
+        Apply {id: "VERIFIED" | "REJECTED"} in one transaction. Verified amounts
+        are credited with one UPDATE over all users, rejected amounts are given
+        back with one UPDATE over all campaigns, and the ledger entries of both
+        are written with one INSERT.
+        Returns {id: error code} for the ids that were not pending.
+        """
+        from campaign.models import Campaign
+        from users.models import User
+
+        errors = {}
+        now = timezone.now()
+        with transaction.atomic():
+            withdraws = cls.objects.select_for_update().in_bulk(statuses.keys())
+            credits = {}
+            refunds = {}
+            transfers = []
+            for id, withdraw_status in statuses.items():
+                withdraw = withdraws.get(id)
+                if withdraw is None:
+                    errors[id] = "not-found"
+                    continue
+                if withdraw.status != "PENDING":
+                    errors[id] = withdraw.status.lower()
+                    continue
+                withdraw.status = withdraw_status
+                withdraw.verified_date = now
+                if withdraw_status == "VERIFIED":
+                    credits[withdraw.user_id] = credits.get(
+                        withdraw.user_id, 0) + withdraw.amount
+                    transfers.append(LedgerEntry.transfer(
+                        "WITHDRAW", withdraw.pk, withdraw.amount, HOLD, wallet_account(withdraw.user_id)))
+                else:
+                    refunds[withdraw.campaign_id] = refunds.get(
+                        withdraw.campaign_id, 0) - withdraw.amount
+                    transfers.append(LedgerEntry.transfer(
+                        "WITHDRAW_REVERSAL", withdraw.pk, withdraw.amount, HOLD,
+                        campaign_account(withdraw.campaign_id)))
+
+            cls.objects.bulk_update(
+                [withdraw for id, withdraw in withdraws.items() if id not in errors], ["status", "verified_date"])
+            increment_by_pk(User, "wallet_amount", credits)
+            increment_by_pk(Campaign, "withdraw_amount", refunds, updated_at=now)
+            LedgerEntry.post(*transfers)
+        return errors
 
     def __str__(self) -> str:
         return f"{self.campaign.title} {self.amount} {self.request_date}"
 
     class Meta:
-        ordering = ("-request_date", )
+        ordering = ("-request_date", "-id")
+        indexes = [
+            models.Index(fields=["user", "-request_date", "-id"],
+                         name="withdraw_user_date_idx"),
+            models.Index(fields=["-request_date", "-id"], name="withdraw_pending_date_idx",
+                         condition=models.Q(status="PENDING")),
+        ]
 
 
 class DonationHistory(models.Model):
@@ -90,4 +236,245 @@ class DonationHistory(models.Model):
         return f"{self.campaign.title} {self.amount} {self.date}"
 
     class Meta:
-        ordering = ("-date", )
+        ordering = ("-date", "-id")
+        indexes = [
+            models.Index(fields=["user", "-date", "-id"], name="donation_user_date_idx"),
+            models.Index(fields=["campaign", "user"],
+                         name="donation_campaign_user_idx"),
+        ]
+
+
+class LedgerQuerySet(models.QuerySet):
+    # Bulk writes skip LedgerEntry.save() and delete(), so they are refused
+    # here too.
+    def update(self, **kwargs):
+        raise ValueError("Ledger entries are append-only.")
+
+    def delete(self):
+        raise ValueError("Ledger entries are append-only.")
+
+    def wallet(self, user):
+        return self.filter(account="WALLET", user=user)
+
+    def balance_at(self, user, at=None):
+        """
+        Wallet balance of user after every entry posted at or before at (now by
+        default): the latest snapshot taken by then plus the entries after it.
+        """
+        at = at or timezone.now()
+        entries = self.wallet(user).filter(created_at__lte=at)
+        balance = 0
+        snapshot = WalletSnapshot.objects.filter(user=user, taken_at__lte=at).first()
+        if snapshot is not None:
+            balance = snapshot.balance
+            entries = entries.filter(id__gt=snapshot.last_entry)
+        return balance + (entries.aggregate(total=Sum("amount"))["total"] or 0)
+
+    def statement(self, user, start, end):
+        """
+        Opening balance of user's wallet at start, every entry posted after it
+        up to end, and the closing balance at end.
+        """
+        opening_balance = self.balance_at(user, start)
+        entries = list(self.wallet(user).filter(
+            created_at__gt=start, created_at__lte=end).order_by("created_at", "id"))
+        return {
+            "opening_balance": opening_balance,
+            "closing_balance": opening_balance + sum(entry.amount for entry in entries),
+            "entries": entries,
+        }
+
+
+class LedgerEntry(models.Model):
+    """
+    One leg of a double-entry wallet ledger. Every transfer writes a negative
+    leg on the account money leaves and a positive one on the account it
+    enters, so all entries sum to zero, and entries are never changed or
+    deleted: User.wallet_amount is a cache of the sum of a wallet's entries.
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    account = models.CharField(max_length=25, choices=(
+        ("WALLET", "WALLET"), ("CAMPAIGN", "CAMPAIGN"), ("BANK", "BANK"), ("HOLD", "HOLD")))
+    user = models.ForeignKey("users.User", on_delete=models.PROTECT, null=True, blank=True,
+                             related_name="ledger_entries", related_query_name="ledger_entries")
+    # No constraint and no cascade: deleting a campaign must leave its legs
+    # untouched, so they keep pointing at the id it had.
+    campaign = models.ForeignKey("campaign.Campaign", on_delete=models.DO_NOTHING, db_constraint=False,
+                                 null=True, blank=True,
+                                 related_name="ledger_entries", related_query_name="ledger_entries")
+
+    kind = models.CharField(max_length=25, choices=(
+        ("OPENING", "OPENING"), ("TOPUP", "TOPUP"), ("DONATION", "DONATION"),
+        ("WITHDRAW_REQUEST", "WITHDRAW_REQUEST"), ("WITHDRAW", "WITHDRAW"),
+        ("WITHDRAW_REVERSAL", "WITHDRAW_REVERSAL")))
+    # id of the TopUpHistory, DonationHistory or WithdrawRequest of the
+    # transfer, or of the user for opening balances.
+    reference = models.PositiveBigIntegerField()
+
+    amount = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = LedgerQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("id", )
+        verbose_name_plural = "ledger entries"
+        indexes = [
+            models.Index(fields=["user", "id"], name="ledger_wallet_idx",
+                         condition=models.Q(account="WALLET")),
+            models.Index(fields=["user", "created_at"], name="ledger_wallet_created_idx",
+                         condition=models.Q(account="WALLET")),
+            models.Index(fields=["kind", "reference"], name="ledger_reference_idx"),
+        ]
+
+    @classmethod
+    def transfer(cls, kind, reference, amount, source, destination):
+        """
+        The two unsaved legs moving amount from the source account to the
+        destination one, see BANK, HOLD, wallet_account and campaign_account.
+        """
+        return [cls(kind=kind, reference=reference, amount=-amount, **source),
+                cls(kind=kind, reference=reference, amount=amount, **destination)]
+
+    @classmethod
+    def post(cls, *transfers):
+        cls.objects.bulk_create(leg for legs in transfers for leg in legs)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only.")
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.reference} {self.account} {self.amount}"
+
+
+def wallet_balances(users, through=None):
+    """
+    Annotate users with ledger_balance, the balance of their wallet from their
+    latest snapshot and the entries after it (up to entry id through), and
+    moved_at, when the newest of those entries was posted.
+    """
+    snapshot = WalletSnapshot.objects.filter(user=OuterRef("pk"))
+    entries = LedgerEntry.objects.filter(
+        account="WALLET", user=OuterRef("pk"), id__gt=OuterRef("snapshot_entry"))
+    if through is not None:
+        entries = entries.filter(id__lte=through)
+    entries = entries.order_by().values("user")
+    return users.annotate(
+        snapshot_entry=Coalesce(Subquery(snapshot.values("last_entry")[:1]), 0),
+        snapshot_balance=Coalesce(Subquery(snapshot.values("balance")[:1]), 0),
+        snapshot_taken_at=Subquery(snapshot.values("taken_at")[:1]),
+        moved=Subquery(entries.annotate(total=Sum("amount")).values("total")),
+        moved_at=Subquery(entries.annotate(last=Max("created_at")).values("last")),
+    ).annotate(ledger_balance=F("snapshot_balance") + Coalesce(F("moved"), 0))
+
+
+class WalletSnapshot(models.Model):
+    """
+    Balance of a wallet through ledger entry last_entry, written by the
+    snapshot_wallets command so balance queries only sum the entries after
+    the latest snapshot. taken_at is when the newest of those was posted.
+    """
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE,
+                             related_name="wallet_snapshots", related_query_name="wallet_snapshots")
+
+    balance = models.BigIntegerField()
+    last_entry = models.PositiveBigIntegerField()
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ("-taken_at", "-id")
+        indexes = [
+            models.Index(fields=["user", "-taken_at", "-id"], name="snapshot_user_taken_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.balance} {self.taken_at}"
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+    def claim(self, user, key, fingerprint):
+        """
+        Insert the (user, key) row, or take over one whose lease ran out
+        before it was completed. Returns (record, claimed): the claimed row
+        to run the request under, or the existing row and False (None if it
+        kept disappearing under us).
+        """
+        for _ in range(3):
+            try:
+                with transaction.atomic():
+                    return self.create(user=user, key=key, fingerprint=fingerprint), True
+            except IntegrityError:
+                pass
+
+            record = self.filter(user=user, key=key).first()
+            if record is None:
+                continue
+            now = timezone.now()
+            expired = now - timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE_SECONDS)
+            if (record.status_code is None and record.fingerprint == fingerprint
+                    and record.locked_at < expired):
+                taken = self.filter(pk=record.pk, status_code__isnull=True,
+                                    locked_at=record.locked_at).update(locked_at=now)
+                if taken:
+                    record.locked_at = now
+                    return record, True
+            return record, False
+        return None, False
+
+    def expired(self):
+        return self.filter(created_at__lt=timezone.now() - settings.IDEMPOTENCY_KEY_TTL)
+
+
+class IdempotencyKey(models.Model):
+    """
+    Idempotency-Key header of a money-moving POST and the response it got.
+    The row is inserted before the request runs, so concurrent duplicates
+    find it and back off, and completed in the request's own transaction, so
+    a key is completed exactly when the work it guards is committed.
+    """
+    KEY_LENGTH = 64
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE,
+                             related_name="idempotency_keys", related_query_name="idempotency_keys")
+    key = models.CharField(max_length=KEY_LENGTH)
+    # sha256 of the method, path and body, so a key reused for another
+    # request is refused instead of replaying the wrong response.
+    fingerprint = models.CharField(max_length=64)
+
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Start of the lease of the request running under the key.
+    locked_at = models.DateTimeField(default=timezone.now)
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="idempotency_user_key_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["created_at"], name="idempotency_created_idx"),
+        ]
+
+    def complete(self, response):
+        """
+        Store response, if the lease is still ours. Call it inside the
+        transaction of the request.
+        """
+        return IdempotencyKey.objects.filter(pk=self.pk, locked_at=self.locked_at).update(
+            status_code=response.status_code, response=response.data) == 1
+
+    def release(self):
+        IdempotencyKey.objects.filter(pk=self.pk, locked_at=self.locked_at).delete()
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.key} {self.status_code}"
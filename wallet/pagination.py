@@ -0,0 +1,15 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class HistoryCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the wallet histories, sliced on the model's
+    (-date, -id) Meta.ordering so every page is an index range scan.
+    """
+    page_size = settings.HISTORY_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.HISTORY_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        return queryset.model._meta.ordering
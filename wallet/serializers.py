@@ -1,7 +1,8 @@
+from app.serializers import DATETIME, RowSerializer, full_name
 from django.db.models import fields
 from rest_framework import serializers
 
-from .models import TopUpHistory
+from .models import LedgerEntry, TopUpHistory
 
 
 class TopUpRequestSerializer(serializers.ModelSerializer):
@@ -20,3 +21,39 @@ class TopUpRequestListSerializer(serializers.ModelSerializer):
     class Meta:
         model = TopUpHistory
         fields = "__all__"
+
+
+class TopUpRequestListRowSerializer(RowSerializer):
+    columns = ('id', 'user__first_name', 'user__last_name', 'user__email', 'date', 'amount', 'status',
+               'bank_name', 'bank_account', 'bank_account_number')
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'user': full_name(row['user__first_name'], row['user__last_name']),
+            'user_email': row['user__email'],
+            'date': DATETIME.to_representation(row['date']),
+            'amount': row['amount'],
+            'status': row['status'],
+            'bank_name': row['bank_name'],
+            'bank_account': row['bank_account'],
+            'bank_account_number': row['bank_account_number'],
+        }
+
+
+class StatementSerializer(serializers.Serializer):
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if "start" in data and "end" in data and data["start"] > data["end"]:
+            raise serializers.ValidationError("start must be before end.")
+        return data
+
+
+class LedgerEntrySerializer(serializers.ModelSerializer):
+    date = serializers.DateTimeField(source="created_at")
+
+    class Meta:
+        model = LedgerEntry
+        fields = ('id', 'date', 'kind', 'reference', 'amount')
@@ -1,14 +1,35 @@
+import csv
+import datetime
+import io
+import json
+from unittest import mock
+
+from app.renderers import CSVRenderer, NDJSONRenderer
+from campaign.models import Campaign
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 from users.models import User
 
-from wallet.models import TopUpHistory
+from wallet.models import (DonationHistory, IdempotencyKey, LedgerEntry,
+                           TopUpHistory, WalletSnapshot, WithdrawRequest)
+from wallet.serializers import (TopUpRequestListRowSerializer,
+                                TopUpRequestListSerializer)
+from wallet.views import TopUpExportView
 
 
 class TopUpViewTests(APITestCase):
     REQUEST_URL = "http://127.0.0.1:8000/api/topup/"
     VERIFY_URL = "http://127.0.0.1:8000/api/topup/requests/"
+    BULK_VERIFY_URL = "http://127.0.0.1:8000/api/topup/requests/bulk/"
 
     @classmethod
     def setUpTestData(cls) -> None:
@@ -143,7 +164,7 @@ class TopUpViewTests(APITestCase):
         top_up = self.top_up_request
         response = self.client.get(self.VERIFY_URL, **self.admin_bearer_token)
 
-        data = response.json()
+        data = response.json()["results"]
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         self.assertEqual(len(data), 1)
@@ -174,3 +195,460 @@ class TopUpViewTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.json().get("code"), "rejected")
+
+    def test_bulk_verify_top_up(self):
+        top_ups = [self.top_up_request for _ in range(3)]
+        rejected = self.top_up_request
+        rejected.reject()
+
+        response = self.client.put(self.BULK_VERIFY_URL, {"requests": [
+            {"id": top_ups[0].id, "status": "VERIFIED"},
+            {"id": top_ups[1].id, "status": "VERIFIED"},
+            {"id": top_ups[2].id, "status": "REJECTED"},
+            {"id": rejected.id, "status": "VERIFIED"},
+            {"id": top_ups[0].id, "status": "REJECTED"},
+            {"id": 1234, "status": "VERIFIED"},
+            {"id": "abc", "status": "VERIFIED"},
+            {"id": top_ups[1].id, "status": "PENDING"},
+        ]}, format="json", **self.admin_bearer_token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(result["success"], result.get("code")) for result in response.json()["results"]], [
+            (True, None), (True, None), (True, None), (False, "rejected"),
+            (False, "duplicate"), (False, "not-found"), (False, "invalid-id"), (False, "invalid-status")])
+        self.assertEqual([TopUpHistory.objects.get(id=top_up.id).status for top_up in top_ups],
+                         ["VERIFIED", "VERIFIED", "REJECTED"])
+        self.assertEqual(User.objects.get(id=self.user.id).wallet_amount, 200000)
+
+    def test_single_and_bulk_verify_same_top_up(self):
+        top_up = self.top_up_request
+        self.client.put(self.BULK_VERIFY_URL, {"requests": [{"id": top_up.id, "status": "VERIFIED"}]},
+                        format="json", **self.admin_bearer_token)
+        response = self.client.patch(
+            self.VERIFY_URL, {"id": top_up.id, "status": "VERIFIED"}, **self.admin_bearer_token)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json().get("code"), "verified")
+        self.assertEqual(User.objects.get(id=self.user.id).wallet_amount, 100000)
+
+    def test_bulk_verify_missing_requests(self):
+        response = self.client.put(
+            self.BULK_VERIFY_URL, {}, format="json", **self.admin_bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_verify_no_admin(self):
+        response = self.client.put(self.BULK_VERIFY_URL, {"requests": [
+            {"id": self.top_up_request.id, "status": "VERIFIED"}]}, format="json", **self.user_bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_top_up_list_row_serializer(self):
+        TopUpHistory.objects.create(user=self.user, **self.data)
+        TopUpHistory.objects.create(user=self.admin, **self.data)
+        queryset = TopUpHistory.objects.all()
+
+        rows = TopUpRequestListRowSerializer(TopUpRequestListRowSerializer.rows(queryset), many=True).data
+        self.assertEqual(JSONRenderer().render(rows),
+                         JSONRenderer().render(TopUpRequestListSerializer(queryset, many=True).data))
+
+    def test_top_up_export(self):
+        TopUpHistory.objects.create(user=self.user, **self.data)
+        TopUpHistory.objects.create(user=self.user, **{**self.data, "bank_account": "Comma, \"Quoted\""})
+        TopUpHistory.objects.create(user=self.admin, **self.data)
+        url = "http://127.0.0.1:8000/api/topup/export/"
+
+        response = self.client.get(url, **self.user_bearer_token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="topups.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row["user_email"] for row in rows}, {"user@user.com"})
+        self.assertIn('Comma, "Quoted"', {row["bank_account"] for row in rows})
+
+        response = self.client.get(url, HTTP_ACCEPT="application/x-ndjson", **self.admin_bearer_token)
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])["amount"], 100000)
+
+        response = self.client.get(f"{url}?format=ndjson", **self.user_bearer_token)
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 2)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    def test_top_up_export_escapes_formulas(self):
+        TopUpHistory.objects.create(user=self.user, **{**self.data, "bank_name": "=HYPERLINK(\"x\")"})
+        TopUpHistory.objects.create(user=self.user, **{**self.data, "bank_account": "-1+2"})
+
+        response = self.client.get("http://127.0.0.1:8000/api/topup/export/", **self.user_bearer_token)
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertIn("'=HYPERLINK(\"x\")", {row["bank_name"] for row in rows})
+        self.assertIn("'-1+2", {row["bank_account"] for row in rows})
+
+        response = self.client.get("http://127.0.0.1:8000/api/topup/export/?format=ndjson", **self.user_bearer_token)
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertIn("=HYPERLINK(\"x\")", {json.loads(line)["bank_name"] for line in lines})
+
+    def test_streaming_renderers_render_data(self):
+        self.assertEqual(CSVRenderer().render({"detail": "Not found."}), b"Not found.\n")
+        self.assertEqual(NDJSONRenderer().render({"detail": "Not found."}), b'{"detail":"Not found."}\n')
+        self.assertEqual(CSVRenderer().render(None), b"")
+
+    def test_top_up_export_streams_in_chunks(self):
+        TopUpHistory.objects.bulk_create(TopUpHistory(user=self.user, **self.data) for _ in range(25))
+        with mock.patch.object(TopUpExportView, "chunk_size", 10):
+            response = self.client.get("http://127.0.0.1:8000/api/topup/export/", **self.user_bearer_token)
+            chunks = list(response.streaming_content)
+        # Header, then rows 10 at a time.
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [1, 10, 10, 5])
+
+    def test_top_up_requests_paginated(self):
+        def get(url):
+            with CaptureQueriesContext(connection) as context:
+                data = self.client.get(url, **self.admin_bearer_token).json()
+            return data, len(context.captured_queries)
+
+        TopUpHistory.objects.create(user=self.user, **self.data)
+        _, expected = get(f"{self.VERIFY_URL}?page_size=2")
+        ids = [TopUpHistory.objects.create(user=self.user, **self.data).id for _ in range(4)]
+
+        data, queries = get(f"{self.VERIFY_URL}?page_size=2")
+        self.assertEqual(queries, expected)
+        self.assertEqual([top_up["id"] for top_up in data["results"]], ids[:1:-1])
+        data, _ = get(data["next"])
+        self.assertEqual([top_up["id"] for top_up in data["results"]], ids[1::-1])
+
+
+class LedgerTests(APITestCase):
+    STATEMENT_URL = "http://127.0.0.1:8000/api/wallet/statement/"
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.donor = User.objects.create_user(
+            email="donor@donor.com", password="donor1234", role="DONATUR", first_name="Te",
+            last_name="st")
+        cls.fundraiser = User.objects.create_user(
+            email="fundraiser@fundraiser.com", password="fundraiser1234", role="FUNDRAISER",
+            first_name="Te", last_name="st", proposal_text="CAMPAIGN", verified=True)
+        cls.campaign = Campaign.objects.create(
+            title="Title", description="Description", target_amount=1000000,
+            fundraiser=cls.fundraiser, status="VERIFIED")
+
+    def top_up(self, amount):
+        top_up = TopUpHistory.objects.create(
+            user=self.donor, amount=amount, bank_name="BCA", bank_account="Donor",
+            bank_account_number="012345678")
+        top_up.verify()
+        return top_up
+
+    def assertInSync(self):
+        self.assertEqual(LedgerEntry.objects.aggregate(total=Sum("amount"))["total"], 0)
+        for user in (self.donor, self.fundraiser):
+            user.refresh_from_db()
+            self.assertEqual(LedgerEntry.objects.balance_at(user), user.wallet_amount)
+        call_command("snapshot_wallets", "--check", stdout=io.StringIO())
+
+    def test_transfers(self):
+        top_up = self.top_up(100000)
+        donation = self.campaign.donate(self.donor, 60000)
+        verified = self.campaign.request_withdraw(self.fundraiser, 40000)
+        rejected = self.campaign.request_withdraw(self.fundraiser, 20000)
+        self.assertIsNone(self.campaign.request_withdraw(self.fundraiser, 1))
+        verified.verify()
+        rejected.reject()
+
+        self.assertEqual(
+            list(LedgerEntry.objects.values_list("kind", "reference", "account", "amount")), [
+                ("TOPUP", top_up.id, "BANK", -100000),
+                ("TOPUP", top_up.id, "WALLET", 100000),
+                ("DONATION", donation.id, "WALLET", -60000),
+                ("DONATION", donation.id, "CAMPAIGN", 60000),
+                ("WITHDRAW_REQUEST", verified.id, "CAMPAIGN", -40000),
+                ("WITHDRAW_REQUEST", verified.id, "HOLD", 40000),
+                ("WITHDRAW_REQUEST", rejected.id, "CAMPAIGN", -20000),
+                ("WITHDRAW_REQUEST", rejected.id, "HOLD", 20000),
+                ("WITHDRAW", verified.id, "HOLD", -40000),
+                ("WITHDRAW", verified.id, "WALLET", 40000),
+                ("WITHDRAW_REVERSAL", rejected.id, "HOLD", -20000),
+                ("WITHDRAW_REVERSAL", rejected.id, "CAMPAIGN", 20000),
+            ])
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.withdraw_amount, 40000)
+        self.assertEqual(LedgerEntry.objects.filter(campaign=self.campaign).aggregate(
+            total=Sum("amount"))["total"], self.campaign.amount - self.campaign.withdraw_amount)
+        self.assertInSync()
+
+    def test_bulk_verify_transfers(self):
+        top_ups = [TopUpHistory.objects.create(
+            user=self.donor, amount=10000, bank_name="BCA", bank_account="Donor",
+            bank_account_number="012345678") for _ in range(2)]
+        TopUpHistory.verify_many({top_ups[0].id: "VERIFIED", top_ups[1].id: "REJECTED"})
+        self.campaign.donate(self.donor, 10000)
+        withdraws = [self.campaign.request_withdraw(self.fundraiser, 5000) for _ in range(2)]
+        WithdrawRequest.verify_many({withdraws[0].id: "VERIFIED", withdraws[1].id: "REJECTED"})
+
+        self.assertEqual(LedgerEntry.objects.filter(kind="TOPUP").count(), 2)
+        self.assertEqual(LedgerEntry.objects.filter(kind="WITHDRAW").count(), 2)
+        self.assertEqual(LedgerEntry.objects.filter(kind="WITHDRAW_REVERSAL").count(), 2)
+        self.assertInSync()
+
+    def test_stale_copies_apply_once(self):
+        top_up = TopUpHistory.objects.create(
+            user=self.donor, amount=10000, bank_name="BCA", bank_account="Donor",
+            bank_account_number="012345678")
+        stale = TopUpHistory.objects.get(pk=top_up.pk)
+        TopUpHistory.verify_many({top_up.id: "VERIFIED"})
+        self.assertFalse(stale.verify())
+        self.assertFalse(stale.reject())
+        self.donor.refresh_from_db()
+        self.assertEqual(self.donor.wallet_amount, 10000)
+        self.assertEqual(LedgerEntry.objects.filter(kind="TOPUP").count(), 2)
+
+        self.campaign.donate(self.donor, 10000)
+        withdraw = self.campaign.request_withdraw(self.fundraiser, 5000)
+        stale = WithdrawRequest.objects.get(pk=withdraw.pk)
+        self.assertTrue(withdraw.verify())
+        self.assertFalse(stale.reject())
+        self.assertFalse(stale.verify())
+        self.assertEqual(stale.status, "PENDING")
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.withdraw_amount, 5000)
+        self.assertEqual(LedgerEntry.objects.filter(kind="WITHDRAW").count(), 2)
+        self.assertFalse(LedgerEntry.objects.filter(kind="WITHDRAW_REVERSAL").exists())
+        self.assertInSync()
+
+    def test_campaign_delete_keeps_entries(self):
+        self.top_up(10000)
+        self.campaign.donate(self.donor, 10000)
+        entries = list(LedgerEntry.objects.values_list("id", "campaign_id", "amount"))
+        campaign_id = self.campaign.id
+        self.campaign.delete()
+        self.assertEqual(list(LedgerEntry.objects.values_list("id", "campaign_id", "amount")), entries)
+        self.assertEqual(LedgerEntry.objects.filter(campaign_id=campaign_id).count(), 1)
+
+    def test_entries_are_append_only(self):
+        self.top_up(10000)
+        entry = LedgerEntry.objects.first()
+        entry.amount = 0
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+        with self.assertRaises(ValueError):
+            LedgerEntry.objects.filter(pk=entry.pk).update(amount=0)
+        with self.assertRaises(ValueError):
+            LedgerEntry.objects.all().delete()
+
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_admin_is_read_only(self):
+        self.top_up(10000)
+        entry = LedgerEntry.objects.first()
+        admin = User.objects.create_superuser(
+            email="admin@admin.com", password="admin3231", first_name="Te", last_name="st")
+        self.client.force_login(admin)
+
+        url = "/admin/wallet/ledgerentry/"
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(f"{url}{entry.pk}/change/").status_code, status.HTTP_200_OK)
+        self.client.post(url, {"action": "delete_selected", "_selected_action": [entry.pk], "post": "yes"})
+        response = self.client.post(f"{url}{entry.pk}/change/", {"amount": 0})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(f"{url}add/").status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(list(LedgerEntry.objects.values_list("amount", flat=True)), [-10000, 10000])
+
+    @override_settings(WALLET_SNAPSHOT_LAG_SECONDS=0)
+    def test_balance_from_snapshot(self):
+        self.top_up(100000)
+        self.campaign.donate(self.donor, 30000)
+        call_command("snapshot_wallets", stdout=io.StringIO())
+        snapshot = WalletSnapshot.objects.get(user=self.donor)
+        self.assertEqual(snapshot.balance, 70000)
+        self.assertEqual(snapshot.last_entry, LedgerEntry.objects.last().id)
+        self.assertFalse(WalletSnapshot.objects.filter(user=self.fundraiser).exists())
+
+        between = timezone.now()
+        self.campaign.donate(self.donor, 20000)
+        with self.assertNumQueries(2):
+            self.assertEqual(LedgerEntry.objects.balance_at(self.donor), 50000)
+        self.assertEqual(LedgerEntry.objects.balance_at(self.donor, between), 70000)
+        self.assertEqual(LedgerEntry.objects.balance_at(self.donor, snapshot.taken_at), 70000)
+        self.assertEqual(LedgerEntry.objects.balance_at(
+            self.donor, snapshot.taken_at - datetime.timedelta(microseconds=1)), 100000)
+
+        # Only wallets with entries after their snapshot get a new one.
+        self.campaign.request_withdraw(self.fundraiser, 10000).verify()
+        call_command("snapshot_wallets", stdout=io.StringIO())
+        self.assertEqual(WalletSnapshot.objects.filter(user=self.donor).first().balance, 50000)
+        call_command("snapshot_wallets", stdout=io.StringIO())
+        self.assertEqual(WalletSnapshot.objects.filter(user=self.donor).count(), 2)
+        self.assertEqual(WalletSnapshot.objects.get(user=self.fundraiser).balance, 10000)
+        self.assertInSync()
+
+    def test_snapshot_leaves_out_recent_entries(self):
+        self.top_up(10000)
+        call_command("snapshot_wallets", stdout=io.StringIO())
+        self.assertFalse(WalletSnapshot.objects.exists())
+
+    def test_check_reports_drift(self):
+        self.top_up(10000)
+        User.objects.filter(pk=self.donor.pk).update(wallet_amount=20000)
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command("snapshot_wallets", "--check", stdout=out)
+        self.assertIn(f"user {self.donor.id}: wallet_amount 20000, ledger 10000", out.getvalue())
+
+    def test_statement(self):
+        start = timezone.now()
+        self.top_up(100000)
+        self.campaign.donate(self.donor, 30000)
+        end = timezone.now()
+        self.campaign.donate(self.donor, 5000)
+        token = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.donor).access_token}"}
+
+        response = self.client.get(
+            self.STATEMENT_URL, {"start": start.isoformat(), "end": end.isoformat()}, **token)
+        data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data["opening_balance"], 0)
+        self.assertEqual(data["closing_balance"], 70000)
+        self.assertEqual([(entry["kind"], entry["amount"], entry["balance"]) for entry in data["entries"]],
+                         [("TOPUP", 100000, 100000), ("DONATION", -30000, 70000)])
+
+        data = self.client.get(self.STATEMENT_URL, {"start": end.isoformat()}, **token).json()
+        self.assertEqual((data["opening_balance"], data["closing_balance"]), (70000, 65000))
+
+        response = self.client.get(
+            self.STATEMENT_URL, {"start": end.isoformat(), "end": start.isoformat()}, **token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IdempotencyTests(APITestCase):
+    TOP_UP_URL = "http://127.0.0.1:8000/api/topup/"
+    DATA = {"bank_name": "BCA", "bank_account": "Donor", "bank_account_number": "012345678", "amount": 100000}
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.donor = User.objects.create_user(
+            email="donor@donor.com", password="donor1234", role="DONATUR", first_name="Te",
+            last_name="st", wallet_amount=100000)
+        cls.fundraiser = User.objects.create_user(
+            email="fundraiser@fundraiser.com", password="fundraiser1234", role="FUNDRAISER",
+            first_name="Te", last_name="st", proposal_text="CAMPAIGN", verified=True)
+        cls.campaign = Campaign.objects.create(
+            title="Title", description="Description", target_amount=1000000, amount=50000,
+            fundraiser=cls.fundraiser, status="VERIFIED")
+
+    def post(self, url, data, user=None, key="key-1"):
+        token = RefreshToken.for_user(user or self.donor).access_token
+        return self.client.post(url, data, format="json", HTTP_AUTHORIZATION=f"Bearer {token}",
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_response(self):
+        first = self.post(self.TOP_UP_URL, self.DATA)
+        retry = self.post(self.TOP_UP_URL, self.DATA)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertFalse(first.has_header("Idempotent-Replayed"))
+        self.assertEqual(TopUpHistory.objects.count(), 1)
+
+        self.post(self.TOP_UP_URL, self.DATA, key="key-2")
+        self.assertEqual(TopUpHistory.objects.count(), 2)
+
+    def test_donation_and_withdraw_retries(self):
+        donate_url = f"http://127.0.0.1:8000/api/donor/campaigns/{self.campaign.id}/"
+        withdraw_url = f"http://127.0.0.1:8000/api/fundraiser/campaigns/{self.campaign.id}/"
+        for _ in range(2):
+            self.assertEqual(self.post(donate_url, {"amount": 10000, "password": "donor1234"}).status_code,
+                             status.HTTP_201_CREATED)
+            self.assertEqual(self.post(withdraw_url, {"amount": 20000}, user=self.fundraiser).status_code,
+                             status.HTTP_201_CREATED)
+
+        self.donor.refresh_from_db()
+        self.campaign.refresh_from_db()
+        self.assertEqual(DonationHistory.objects.count(), 1)
+        self.assertEqual(self.donor.wallet_amount, 90000)
+        self.assertEqual(WithdrawRequest.objects.count(), 1)
+        self.assertEqual(self.campaign.withdraw_amount, 20000)
+
+    def test_key_reused_for_another_request(self):
+        self.post(self.TOP_UP_URL, self.DATA)
+        response = self.post(self.TOP_UP_URL, {**self.DATA, "amount": 200000})
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(TopUpHistory.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        other = User.objects.create_user(
+            email="other@donor.com", password="donor1234", role="DONATUR", first_name="Te",
+            last_name="st")
+        self.post(self.TOP_UP_URL, self.DATA)
+        response = self.post(self.TOP_UP_URL, self.DATA, user=other)
+
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        self.assertEqual(TopUpHistory.objects.filter(user=other).count(), 1)
+
+    def test_concurrent_duplicate(self):
+        retries = []
+
+        def create(**kwargs):
+            # The retry arrives while the first request is still running.
+            retries.append(self.post(self.TOP_UP_URL, self.DATA))
+            top_up = TopUpHistory(**kwargs)
+            top_up.save()
+            return top_up
+
+        with mock.patch.object(TopUpHistory.objects, "create", side_effect=create):
+            response = self.post(self.TOP_UP_URL, self.DATA)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retries[0].status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(retries[0]["Retry-After"], "1")
+        self.assertEqual(TopUpHistory.objects.count(), 1)
+
+    def test_expired_lease_is_taken_over(self):
+        self.post(self.TOP_UP_URL, self.DATA)
+        TopUpHistory.objects.all().delete()
+        # As if the worker died before the request's transaction committed.
+        IdempotencyKey.objects.update(status_code=None, response=None)
+
+        self.assertEqual(self.post(self.TOP_UP_URL, self.DATA).status_code, status.HTTP_409_CONFLICT)
+        IdempotencyKey.objects.update(locked_at=timezone.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(self.post(self.TOP_UP_URL, self.DATA).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(TopUpHistory.objects.count(), 1)
+        self.assertEqual(self.post(self.TOP_UP_URL, self.DATA)["Idempotent-Replayed"], "true")
+
+    def test_lost_lease_rolls_back(self):
+        with mock.patch.object(IdempotencyKey, "complete", return_value=False):
+            response = self.post(self.TOP_UP_URL, self.DATA)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(TopUpHistory.objects.exists())
+
+    def test_errors_are_not_stored(self):
+        data = {**self.DATA, "amount": 1}
+        self.assertEqual(self.post(self.TOP_UP_URL, data).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.post(self.TOP_UP_URL, self.DATA).status_code, status.HTTP_201_CREATED)
+
+    def test_invalid_key(self):
+        response = self.post(self.TOP_UP_URL, self.DATA, key="k" * 65)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TopUpHistory.objects.exists())
+
+    def test_purge(self):
+        self.post(self.TOP_UP_URL, self.DATA)
+        self.post(self.TOP_UP_URL, self.DATA, key="key-2")
+        IdempotencyKey.objects.filter(key="key-1").update(
+            created_at=timezone.now() - datetime.timedelta(days=2))
+
+        out = io.StringIO()
+        call_command("purge_idempotency_keys", "--batch-size", "1", stdout=out)
+        self.assertIn("Purged 1 idempotency key(s).", out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["key-2"])
@@ -1,8 +1,13 @@
 from django.urls import path
 
-from .views import TopUpRequestView, TopUpVerifyView
+from .views import (TopUpBulkVerifyView, TopUpExportView, TopUpRequestView,
+                    TopUpVerifyView, WalletStatementView)
 
 urlpatterns = [
     path("topup/", TopUpRequestView.as_view(), name="topup"),
-    path("topup/requests/", TopUpVerifyView.as_view(), name="topup-verify")
+    path("topup/export/", TopUpExportView.as_view(), name="topup-export"),
+    path("topup/requests/", TopUpVerifyView.as_view(), name="topup-verify"),
+    path("topup/requests/bulk/", TopUpBulkVerifyView.as_view(),
+         name="topup-verify-bulk"),
+    path("wallet/statement/", WalletStatementView.as_view(), name="wallet-statement"),
 ]
@@ -1,12 +1,24 @@
-from django.shortcuts import get_object_or_404
+import csv
+import datetime
+import itertools
+
+from app.renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer
+from app.serializers import DATETIME, RowListMixin
+from campaign.cache import invalidate_notification_counts
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from rest_framework import generics, status, views
-from rest_framework.permissions import IsAdminUser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from users.permissions import IsDonatur
 
-from wallet.models import TopUpHistory
+from wallet.idempotency import idempotent
+from wallet.models import LedgerEntry, TopUpHistory
+from wallet.pagination import HistoryCursorPagination
 
-from .serializers import TopUpRequestListSerializer, TopUpRequestSerializer
+from .serializers import (LedgerEntrySerializer, StatementSerializer,
+                          TopUpRequestListRowSerializer,
+                          TopUpRequestListSerializer, TopUpRequestSerializer)
 
 
 class TopUpRequestView(generics.ListCreateAPIView):
@@ -19,6 +31,7 @@ class TopUpRequestView(generics.ListCreateAPIView):
     def get_queryset(self):
         return TopUpHistory.objects.filter(user=self.request.user)
 
+    @idempotent
     def create(self, request):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
@@ -27,15 +40,17 @@ class TopUpRequestView(generics.ListCreateAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class TopUpVerifyView(generics.ListAPIView, generics.UpdateAPIView):
+class TopUpVerifyView(RowListMixin, generics.ListAPIView, generics.UpdateAPIView):
     """
     PUT, PATCH    api/topup/requests/  -  Verify top up request by id
-    GET           api/topup/requests/  -  Top up requests list
+    GET           api/topup/requests/  -  Top up requests list (cursor paginated)
     """
 
     permission_classes = (IsAdminUser, )
     queryset = TopUpHistory.objects.filter(status="PENDING")
     serializer_class = TopUpRequestListSerializer
+    row_serializer_class = TopUpRequestListRowSerializer
+    pagination_class = HistoryCursorPagination
 
     def update(self, request, *args, **kwargs):
         id = request.data.get("id")
@@ -51,16 +66,215 @@ class TopUpVerifyView(generics.ListAPIView, generics.UpdateAPIView):
         if not top_up_status or top_up_status not in ("VERIFIED", "REJECTED"):
             return Response({"status": ["Invalid status"]}, status=status.HTTP_400_BAD_REQUEST)
 
-        top_up_request = get_object_or_404(TopUpHistory, id=id)
+        error = verify_one(TopUpHistory, int(id), top_up_status)
+        if error is not None:
+            return error
 
-        if top_up_request.status == "VERIFIED":
-            return Response({"error": ["Already verified."], "code": "verified"}, status=status.HTTP_400_BAD_REQUEST)
-        if top_up_request.status == "REJECTED":
-            return Response({"error": ["Already rejected."], "code": "rejected"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"success": True})
 
-        if top_up_status == "VERIFIED":
-            top_up_request.verify()
-        else:
-            top_up_request.reject()
 
-        return Response({"success": True})
+def verify_one(model, id, new_status):
+    """
+    Verify or reject one request of model through model.verify_many, the
+    same locked transition the bulk endpoints use. Returns the error
+    Response when the request isn't pending, None once it is applied.
+    """
+    error = model.verify_many({id: new_status}).get(id)
+    invalidate_notification_counts()
+    if error == "not-found":
+        raise Http404
+    if error == "verified":
+        return Response({"error": ["Already verified."], "code": "verified"}, status=status.HTTP_400_BAD_REQUEST)
+    if error == "rejected":
+        return Response({"error": ["Already rejected."], "code": "rejected"}, status=status.HTTP_400_BAD_REQUEST)
+    return None
+
+
+class BulkVerifyView(views.APIView):
+    """
+    Base view verifying many requests of `model` at once through
+    `model.verify_many`.
+    body: {"requests": [{"id": 1, "status": "VERIFIED"}, {"id": 2, "status": "REJECTED"}]}
+    """
+
+    permission_classes = (IsAdminUser, )
+    model = None
+
+    def put(self, request, *args, **kwargs):
+        items = request.data.get("requests")
+
+        if not isinstance(items, list) or not items:
+            return Response({"requests": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        items = [dict(item) if isinstance(item, dict) else {} for item in items]
+        codes = []
+        statuses = {}
+        for item in items:
+            id, item_status = item.get("id"), item.get("status")
+            try:
+                id = item["id"] = int(id)
+            except (TypeError, ValueError):
+                codes.append("invalid-id")
+                continue
+            if item_status not in ("VERIFIED", "REJECTED"):
+                codes.append("invalid-status")
+            elif id in statuses:
+                codes.append("duplicate")
+            else:
+                statuses[id] = item_status
+                codes.append(None)
+
+        errors = self.model.verify_many(statuses) if statuses else {}
+        invalidate_notification_counts()
+
+        results = []
+        for item, code in zip(items, codes):
+            code = code or errors.get(item["id"])
+            if code:
+                results.append({"id": item.get("id"), "success": False, "code": code})
+            else:
+                results.append({"id": item["id"], "success": True, "status": item["status"]})
+
+        return Response({"results": results})
+
+    def patch(self, request, *args, **kwargs):
+        return self.put(request, *args, **kwargs)
+
+
+def csv_cell(value):
+    """
+    Quote text a spreadsheet would read as a formula, such as a bank name
+    starting with "=", so opening an export never runs user input.
+    """
+    if isinstance(value, str) and value.startswith(("=", "+", "-", "@", "\t", "\r")):
+        return f"'{value}"
+    return value
+
+
+class Echo:
+    """
+    File-like object handing back what csv.writer writes to it.
+    """
+
+    def write(self, value):
+        return value
+
+
+class HistoryExportView(views.APIView):
+    """
+    Base view streaming the rows of `model` as CSV, or NDJSON with
+    ?format=ndjson or Accept: application/x-ndjson. Admins export every
+    user's rows, everyone else only their own.
+
+    `columns` maps each output column to a values() lookup. Rows are read
+    with a chunked iterator and written chunk by chunk, so memory stays flat
+    whatever the number of rows.
+    """
+    renderer_classes = (CSVRenderer, NDJSONRenderer)
+    model = None
+    columns = {}
+    filename = None
+    chunk_size = 2000
+
+    def get_queryset(self):
+        queryset = self.model.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
+
+    def handle_exception(self, exc):
+        # Errors are plain JSON responses, not part of the export.
+        self.request.accepted_renderer = FastJSONRenderer()
+        self.request.accepted_media_type = FastJSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    def get(self, request, *args, **kwargs):
+        rows = self.get_queryset().values_list(*self.columns.values()).iterator(chunk_size=self.chunk_size)
+        rows = (tuple(DATETIME.to_representation(value) if isinstance(value, datetime.datetime) else value
+                      for value in row) for row in rows)
+
+        renderer = request.accepted_renderer
+        content = self.csv_chunks(rows) if renderer.format == "csv" else self.ndjson_chunks(rows)
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{self.filename}.{renderer.format}"'
+        return response
+
+    def chunks(self, rows):
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def csv_chunks(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.columns)
+        for chunk in self.chunks(rows):
+            yield "".join(writer.writerow(map(csv_cell, row)) for row in chunk)
+
+    def ndjson_chunks(self, rows):
+        encode = FastJSONRenderer().render
+        names = tuple(self.columns)
+        for chunk in self.chunks(rows):
+            yield b"".join(encode(dict(zip(names, row))) + b"\n" for row in chunk)
+
+
+class TopUpExportView(HistoryExportView):
+    """
+    GET    api/topup/export/  -  Top up history as CSV or NDJSON
+    """
+    permission_classes = (IsDonatur | IsAdminUser, )
+    model = TopUpHistory
+    filename = "topups"
+    columns = {
+        "id": "id",
+        "date": "date",
+        "user_email": "user__email",
+        "amount": "amount",
+        "status": "status",
+        "bank_name": "bank_name",
+        "bank_account": "bank_account",
+        "bank_account_number": "bank_account_number",
+    }
+
+
+class TopUpBulkVerifyView(BulkVerifyView):
+    """
+    PUT, PATCH    api/topup/requests/bulk/  -  Verify many top up requests at once
+    """
+    model = TopUpHistory
+
+
+class WalletStatementView(views.APIView):
+    """
+    GET    api/wallet/statement/  -  Wallet entries between ?start= and ?end=
+                                     (the last 30 days by default) with the
+                                     opening, running and closing balance
+    """
+    permission_classes = (IsAuthenticated, )
+    default_period = datetime.timedelta(days=30)
+
+    def get(self, request):
+        serializer = StatementSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        end = serializer.validated_data.get("end") or timezone.now()
+        start = serializer.validated_data.get("start") or end - self.default_period
+        statement = LedgerEntry.objects.statement(request.user, start, end)
+
+        balance = statement["opening_balance"]
+        entries = LedgerEntrySerializer(statement["entries"], many=True).data
+        for entry in entries:
+            balance += entry["amount"]
+            entry["balance"] = balance
+        return Response({
+            "start": DATETIME.to_representation(start),
+            "end": DATETIME.to_representation(end),
+            "opening_balance": statement["opening_balance"],
+            "closing_balance": statement["closing_balance"],
+            "entries": entries,
+        }, status=status.HTTP_200_OK)